@@ -0,0 +1,465 @@
+import itertools
+import json
+import os
+import pickle
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Reproducible synthetic inputs + throughput measurements for every pipeline stage.
+# Results are written as JSON so two runs can be compared with --compare.
+
+EN_WORDS = [
+    "innovation", "company", "sustainable", "growth", "digital", "customer", "energy", "report",
+    "strategy", "development", "technology", "investment", "research", "market", "employees",
+    "risk", "management", "value", "environment", "product", "service", "process", "new",
+    "the", "and", "of", "to", "in", "for", "with", "our", "is", "are", "we", "on", "by",
+]
+ES_WORDS = [
+    "innovación", "compañía", "sostenible", "crecimiento", "digital", "cliente", "energía", "informe",
+    "estrategia", "desarrollo", "tecnología", "inversión", "investigación", "mercado", "empleados",
+    "riesgo", "gestión", "valor", "medio", "ambiente", "producto", "servicio", "proceso", "nuevo",
+    "el", "la", "de", "que", "y", "en", "los", "las", "por", "con", "para", "una", "del",
+]
+SYLLABLES = ["in", "no", "va", "ción", "ma", "te", "ri", "al", "sos", "ten", "ble", "pro",
+             "duc", "to", "ges", "tión", "mer", "ca", "do", "ener", "gía", "des", "arro", "llo"]
+
+
+# === SYNTHETIC INPUTS ===
+
+def synthetic_text(rng, words, spanish_ratio=0.5, sentence_len=14):
+    """Generate text of roughly 'words' words, mixing EN and ES sentences"""
+    sentences = []
+    written = 0
+    while written < words:
+        pool = ES_WORDS if rng.random() < spanish_ratio else EN_WORDS
+        sentence = [rng.choice(pool) for _ in range(sentence_len)]
+        # Digits and punctuation exercise the preprocessing regexes
+        sentence.insert(rng.randrange(sentence_len), str(rng.randint(1, 2024)))
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        written += sentence_len + 1
+    return " ".join(sentences)
+
+
+def generate_pdfs(folder, count=4, pages=10, words_per_page=350, spanish_ratio=0.5, seed=0):
+    """Write 'count' PDFs with 'pages' text pages each. Returns the total number of pages."""
+    import fitz
+
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    for i in range(count):
+        with fitz.open() as doc:
+            for _ in range(pages):
+                page = doc.new_page()
+                text = synthetic_text(rng, words_per_page, spanish_ratio)
+                page.insert_textbox(page.rect + (40, 40, -40, -40), text, fontsize=8)
+            doc.save(folder / f"synthetic_{i:04d}.pdf")
+
+    return count * pages
+
+
+def zipf_vocabulary(rng, size):
+    """Deterministic pseudo-Spanish vocabulary of 'size' distinct words, in random rank order"""
+    vocabulary = []
+    seen = set()
+    for length in itertools.count(2):
+        for syllables in itertools.product(SYLLABLES, repeat=length):
+            word = "".join(syllables)
+            if word not in seen:
+                seen.add(word)
+                vocabulary.append(word)
+            if len(vocabulary) == size:
+                rng.shuffle(vocabulary)
+                return vocabulary
+
+
+def generate_token_files(folder, count=50, tokens=3000, vocabulary_size=5000, exponent=1.1, seed=0):
+    """Write preprocessed-style token files with a Zipfian word distribution. Returns total tokens."""
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    vocabulary = zipf_vocabulary(rng, vocabulary_size)
+    weights = [1.0 / (rank ** exponent) for rank in range(1, vocabulary_size + 1)]
+    cumulative = list(itertools.accumulate(weights))
+
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=cumulative, k=tokens)
+        with open(folder / f"synthetic_{i:04d}.txt", 'w', encoding='utf-8') as f:
+            f.write(" ".join(words))
+
+    return count * tokens
+
+
+class StubTranslation:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubTranslator:
+    """Local stand-in for googletrans.Translator: returns the chunk unchanged"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def translate(self, text, src='en', dest='es'):
+        if self.delay:
+            time.sleep(self.delay)
+        return StubTranslation(text)
+
+
+# Modules that worker processes import; they must stay cheap to import
+PIPELINE_MODULES = [
+    "pdfExtraction", "removePageMarkers", "translateES", "preprocessingText", "postprocessingText",
+    "lda_analysis", "visualization", "instrumentation", "pipeline", "work_queue", "lda_ensemble",
+    "innovation_index", "cooccurrence", "dedup", "benchmark",
+]
+# Dependencies that may only be loaded on first use, never at import
+HEAVY_MODULES = ["fitz", "googletrans", "langdetect", "spacy", "gensim", "numpy", "scipy",
+                 "matplotlib", "seaborn", "networkx"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+# === BENCHMARKS ===
+# Each benchmark gets a scratch folder and the options and returns
+# {"value": throughput or seconds, "unit": ..., "higher_is_better": bool, ...}
+
+def _best_of(repeat, func):
+    # Run func 'repeat' times and keep the fastest wall time
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_extract(scratch, options):
+    from pdfExtraction import extract_pdf_text
+
+    pdf_folder = scratch / "pdfs"
+    total_pages = generate_pdfs(pdf_folder, options.docs, options.pages, seed=options.seed)
+    pdf_files = sorted(pdf_folder.glob("*.pdf"))
+    output_folder = scratch / "articles"
+    output_folder.mkdir(exist_ok=True)
+
+    seconds = _best_of(options.repeat, lambda: [extract_pdf_text(p, output_folder) for p in pdf_files])
+    return {"value": total_pages / seconds, "unit": "pages/s", "higher_is_better": True,
+            "seconds": seconds, "pages": total_pages}
+
+
+def bench_extract_archive(scratch, options):
+    import tarfile
+    from pdfExtraction import extract_pdf_text, iter_archive_pdfs
+
+    # Same PDFs as bench_extract, streamed from a .tar.gz instead of a folder
+    pdf_folder = scratch / "archive_pdfs"
+    total_pages = generate_pdfs(pdf_folder, options.docs, options.pages, seed=options.seed)
+    archive_path = scratch / "pdfs.tar.gz"
+    with tarfile.open(archive_path, "w:gz") as archive:
+        for pdf_file in sorted(pdf_folder.glob("*.pdf")):
+            archive.add(pdf_file, pdf_file.name)
+    output_folder = scratch / "archive_articles"
+    output_folder.mkdir(exist_ok=True)
+
+    seconds = _best_of(options.repeat, lambda: [extract_pdf_text(Path(name), output_folder, data)
+                                                for name, data in iter_archive_pdfs(archive_path)])
+    return {"value": total_pages / seconds, "unit": "pages/s", "higher_is_better": True,
+            "seconds": seconds, "pages": total_pages}
+
+
+def bench_clean(scratch, options):
+    from removePageMarkers import remove_page_headers_from_file
+
+    rng = random.Random(options.seed)
+    pages = [synthetic_text(rng, 350) for _ in range(options.docs * options.pages)]
+    content = "".join(f"--- Page {i + 1} ---\n{text}\n\n" for i, text in enumerate(pages))
+    text_file = scratch / "marked.txt"
+
+    def run():
+        with open(text_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        start_time = time.perf_counter()
+        remove_page_headers_from_file(text_file)
+        return time.perf_counter() - start_time
+
+    # Only the cleaning itself is timed, not rewriting the input
+    seconds = min(run() for _ in range(options.repeat))
+    return {"value": len(content) / seconds, "unit": "chars/s", "higher_is_better": True,
+            "seconds": seconds, "chars": len(content)}
+
+
+def bench_dedup(scratch, options):
+    from dedup import deduplicate_corpus
+
+    # Cleaned texts sharing a disclaimer page, every fourth one a near copy of the previous one
+    rng = random.Random(options.seed)
+    disclaimer = synthetic_text(random.Random(options.seed + 1), 120, spanish_ratio=0.0)
+    input_folder = scratch / "dedup_input"
+    input_folder.mkdir(exist_ok=True)
+    documents = []
+    for i in range(options.docs):
+        if i % 4 == 3:
+            pages = list(documents[-1])
+            pages[0] += " " + synthetic_text(rng, 15)
+        else:
+            pages = [synthetic_text(rng, 350) for _ in range(options.pages)] + [disclaimer]
+        documents.append(pages)
+        with open(input_folder / f"synthetic_{i:04d}.txt", 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(pages))
+
+    reports = []
+
+    def run():
+        shutil.rmtree(scratch / "deduplicated", ignore_errors=True)
+        reports.append(deduplicate_corpus(str(input_folder), str(scratch / "deduplicated")))
+
+    seconds = _best_of(options.repeat, run)
+    report = reports[-1]
+    return {"value": report["chars_in"] / seconds, "unit": "chars/s", "higher_is_better": True,
+            "seconds": seconds, "chars": report["chars_in"], "chars_saved": report["chars_saved"],
+            "tokens_saved": report["tokens_saved"], "duplicates": report["duplicate_documents"]}
+
+
+def bench_translate(scratch, options):
+    from translateES import translate_text_to_spanish
+
+    rng = random.Random(options.seed)
+    text = synthetic_text(rng, options.docs * options.pages * 350, spanish_ratio=0.0)
+    translator = StubTranslator(options.translate_delay)
+
+    seconds = _best_of(options.repeat, lambda: translate_text_to_spanish(text, translator=translator))
+    return {"value": len(text) / seconds, "unit": "chars/s", "higher_is_better": True,
+            "seconds": seconds, "chars": len(text)}
+
+
+def bench_preprocess(scratch, options):
+    from preprocessingText import process_text_chunk
+
+    rng = random.Random(options.seed)
+    text = synthetic_text(rng, options.docs * options.pages * 350, spanish_ratio=1.0)
+    input_tokens = len(text.split())
+
+    seconds = _best_of(options.repeat, lambda: process_text_chunk(text))
+    return {"value": input_tokens / seconds, "unit": "tokens/s", "higher_is_better": True,
+            "seconds": seconds, "tokens": input_tokens}
+
+
+def _token_corpus(scratch, options):
+    from lda_analysis import load_documents, build_corpus
+
+    token_folder = scratch / "preprocessed"
+    if not token_folder.exists():
+        generate_token_files(token_folder, options.token_docs, options.tokens,
+                             options.vocabulary, seed=options.seed)
+    documents, file_names = load_documents(token_folder)
+    id2word, corpus = build_corpus(documents)
+    return documents, file_names, id2word, corpus
+
+
+def bench_lda(scratch, options):
+    from lda_analysis import train_lda_model
+
+    documents, file_names, id2word, corpus = _token_corpus(scratch, options)
+    seconds = _best_of(options.repeat, lambda: train_lda_model(corpus, id2word, options.topics, options.passes))
+    return {"value": seconds / options.passes, "unit": "s/pass", "higher_is_better": False,
+            "seconds": seconds, "passes": options.passes, "vocabulary": len(id2word)}
+
+
+def bench_coherence(scratch, options):
+    from lda_analysis import train_lda_model, compute_coherence
+
+    documents, file_names, id2word, corpus = _token_corpus(scratch, options)
+    lda_model = train_lda_model(corpus, id2word, options.topics, passes=1)
+
+    seconds = _best_of(options.repeat, lambda: compute_coherence(lda_model, documents, id2word))
+    return {"value": seconds, "unit": "s/pass", "higher_is_better": False, "seconds": seconds}
+
+
+def bench_charts(scratch, options):
+    import matplotlib
+    matplotlib.use('Agg')
+    from lda_analysis import train_lda_model
+    from visualization import create_advanced_visualizations
+
+    documents, file_names, id2word, corpus = _token_corpus(scratch, options)
+    lda_model = train_lda_model(corpus, id2word, options.topics, passes=1)
+    topic_matrix = [[prob for _, prob in lda_model.get_document_topics(bow, minimum_probability=0)]
+                    for bow in corpus]
+    topic_distribution = [(i, max(range(options.topics), key=lambda t: row[t]), file_names[i])
+                          for i, row in enumerate(topic_matrix)]
+    results_file = scratch / "lda_results.pkl"
+    with open(results_file, 'wb') as f:
+        pickle.dump({'lda_model': lda_model, 'file_names': file_names, 'topic_matrix': topic_matrix,
+                     'topic_distribution': topic_distribution, 'num_topics': options.topics}, f)
+
+    chart_folder = scratch / "charts"
+    chart_folder.mkdir(exist_ok=True)
+    previous_dir = os.getcwd()
+    os.chdir(chart_folder)
+    try:
+        seconds = _best_of(options.repeat, lambda: create_advanced_visualizations(str(results_file), show=False))
+    finally:
+        os.chdir(previous_dir)
+    return {"value": seconds, "unit": "s/pass", "higher_is_better": False, "seconds": seconds}
+
+
+def import_times(modules=PIPELINE_MODULES, repeat=3):
+    """Import time of each module in a fresh interpreter (best of 'repeat') + heavy modules it loaded"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    timings = {}
+    for module in modules:
+        best = None
+        for _ in range(repeat):
+            probe = subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   cwd=repo, capture_output=True, text=True)
+            if probe.returncode != 0:
+                raise RuntimeError(f"import {module} failed: {probe.stderr.strip().splitlines()[-1]}")
+            result = json.loads(probe.stdout.strip().splitlines()[-1])
+            if best is None or result["seconds"] < best["seconds"]:
+                best = result
+        timings[module] = best
+    return timings
+
+
+def bench_imports(scratch, options):
+    timings = import_times(repeat=options.repeat)
+    slowest = max(timings, key=lambda m: timings[m]["seconds"])
+    over_budget = [m for m, t in timings.items() if t["seconds"] * 1000 > options.import_budget_ms]
+    heavy = {m: t["heavy"] for m, t in timings.items() if t["heavy"]}
+    for module, timing in sorted(timings.items(), key=lambda kv: -kv[1]["seconds"]):
+        print(f"  {module:<20} {timing['seconds'] * 1000:7.1f} ms {' '.join(timing['heavy'])}")
+    return {"value": timings[slowest]["seconds"], "unit": "s (slowest import)", "higher_is_better": False,
+            "slowest": slowest, "modules": {m: t["seconds"] for m, t in timings.items()},
+            "over_budget": over_budget, "heavy_imports": heavy}
+
+
+BENCHMARKS = {
+    "extract": bench_extract,
+    "extract_archive": bench_extract_archive,
+    "clean": bench_clean,
+    "dedup": bench_dedup,
+    "translate": bench_translate,
+    "preprocess": bench_preprocess,
+    "lda": bench_lda,
+    "coherence": bench_coherence,
+    "charts": bench_charts,
+    "imports": bench_imports,
+}
+
+
+# === RUN / COMPARE ===
+
+def run_benchmarks(options, names=None):
+    """Run the selected benchmarks and return the JSON-ready report"""
+    names = names or list(BENCHMARKS)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {k: v for k, v in vars(options).items() if k not in ("only", "output", "compare")},
+        },
+        "results": {},
+    }
+
+    scratch = Path(tempfile.mkdtemp(prefix="bench_"))
+    try:
+        for name in names:
+            print(f"Running benchmark: {name}...")
+            try:
+                result = BENCHMARKS[name](scratch, options)
+            except Exception as e:
+                print(f"  ERROR in {name}: {e}")
+                report["results"][name] = {"error": str(e)}
+                continue
+            report["results"][name] = result
+            print(f"  {name}: {result['value']:.4g} {result['unit']}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return report
+
+
+def compare_reports(baseline, current, tolerance=0.10):
+    """Print the change per benchmark; returns the names that regressed beyond tolerance"""
+    regressions = []
+    print("=" * 60)
+    print(f"{'benchmark':<12} {'baseline':>14} {'current':>14} {'change':>10}")
+    print("=" * 60)
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or "value" not in old or "value" not in result:
+            continue
+
+        change = (result["value"] - old["value"]) / old["value"]
+        # Positive 'slowdown' means worse, whatever the unit direction
+        slowdown = -change if result["higher_is_better"] else change
+        flag = ""
+        if slowdown > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<12} {old['value']:>14.4g} {result['value']:>14.4g} {change:>+9.1%}{flag}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Synthetic-corpus benchmarks for every pipeline stage.")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="Benchmarks to run (default: all)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before flagging (0.10 = 10%%)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per benchmark (best is kept)")
+    parser.add_argument("--docs", type=int, default=4, help="Synthetic PDFs / text documents")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF")
+    parser.add_argument("--token-docs", type=int, default=50, help="Token files for LDA / coherence / charts")
+    parser.add_argument("--tokens", type=int, default=3000, help="Tokens per token file")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="Zipfian vocabulary size")
+    parser.add_argument("--topics", type=int, default=6)
+    parser.add_argument("--passes", type=int, default=5)
+    parser.add_argument("--translate-delay", type=float, default=0.0, help="Simulated latency per translated chunk")
+    parser.add_argument("--import-budget-ms", type=float, default=50.0,
+                        help="Maximum import time per module; the imports benchmark fails above it")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args, args.only)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to '{args.output}'")
+
+    failed = False
+    imports = report["results"].get("imports", {})
+    if imports.get("over_budget") or imports.get("heavy_imports"):
+        print(f"IMPORT CHECK FAILED: over {args.import_budget_ms:.0f} ms: {imports['over_budget']}, "
+              f"heavy dependencies loaded at import: {imports['heavy_imports']}")
+        failed = True
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report, args.tolerance):
+            failed = True
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,297 @@
+import csv
+import math
+import pickle
+from collections import Counter
+
+from instrumentation import track, tracked
+from lda_analysis import load_documents
+
+# Term co-occurrence graph over the token corpus.
+# Counts are built with sparse-matrix products (document level) or shifted
+# index arrays (sliding window), weighted with PMI / NPMI and pruned to the
+# top-k neighbours of every term. Weighting and pruning work on blocks of
+# block_size rows. At document level only such a block of the term x term
+# count matrix exists at a time; in window mode the sparse count matrix is
+# built once (its marginals are needed first) and then read block by block.
+
+
+def build_vocabulary(documents, min_count=5, terms=None, max_terms=None):
+    """term -> id for terms seen at least min_count times (optionally only 'terms')"""
+    counts = Counter(token for doc in documents for token in doc)
+    if terms is not None:
+        counts = Counter({term: counts[term] for term in terms if counts[term] > 0})
+    selected = [term for term, count in counts.most_common(max_terms) if count >= min_count]
+    return {term: i for i, term in enumerate(selected)}, counts
+
+
+def _doc_ids(doc, vocabulary):
+    # Token ids with -1 for terms outside the vocabulary (positions are kept)
+    import numpy as np
+
+    return np.fromiter((vocabulary.get(token, -1) for token in doc), dtype=np.int64, count=len(doc))
+
+
+def document_term_matrix(documents, vocabulary):
+    """Binary documents x terms CSR matrix"""
+    import numpy as np
+    from scipy import sparse
+
+    rows, cols = [], []
+    for doc_idx, doc in enumerate(documents):
+        ids = np.unique(_doc_ids(doc, vocabulary))
+        ids = ids[ids >= 0]
+        rows.append(np.full(len(ids), doc_idx, dtype=np.int64))
+        cols.append(ids)
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                             shape=(len(documents), len(vocabulary)))
+
+
+def window_cooccurrence(documents, vocabulary, window=10, flush_pairs=5_000_000):
+    """Symmetric terms x terms counts of pairs at most 'window' tokens apart"""
+    import numpy as np
+    from scipy import sparse
+
+    size = len(vocabulary)
+    batches = []    # (rows, cols, counts) of the distinct pairs of every batch, rows < cols
+    buffer_rows, buffer_cols, buffered = [], [], 0
+
+    def flush():
+        # Merges the duplicate pairs of one batch only; all batches are summed once at the end
+        nonlocal buffer_rows, buffer_cols, buffered
+        if buffered:
+            batch = sparse.coo_matrix((np.ones(buffered, dtype=np.float32),
+                                       (np.concatenate(buffer_rows), np.concatenate(buffer_cols))),
+                                      shape=(size, size))
+            batch.sum_duplicates()
+            batches.append((batch.row, batch.col, batch.data))
+        buffer_rows, buffer_cols, buffered = [], [], 0
+
+    for doc in documents:
+        ids = _doc_ids(doc, vocabulary)
+        for distance in range(1, window + 1):
+            left, right = ids[:-distance], ids[distance:]
+            keep = (left >= 0) & (right >= 0) & (left != right)
+            # Each unordered pair once (upper triangle), mirrored when the matrix is built
+            buffer_rows.append(np.minimum(left[keep], right[keep]))
+            buffer_cols.append(np.maximum(left[keep], right[keep]))
+            buffered += int(keep.sum())
+        if buffered >= flush_pairs:
+            flush()
+    flush()
+
+    if not batches:
+        return sparse.csr_matrix((size, size), dtype=np.float32)
+    rows = np.concatenate([batch[0] for batch in batches])
+    cols = np.concatenate([batch[1] for batch in batches])
+    data = np.concatenate([batch[2] for batch in batches])
+    del batches
+    symmetric = (np.concatenate([rows, cols]), np.concatenate([cols, rows]))
+    return sparse.csr_matrix((np.concatenate([data, data]), symmetric), shape=(size, size))
+
+
+def _weight_block(counts, row_offset, marginals, total, measure):
+    # PMI / NPMI weights of a CSR block of counts whose first row is term row_offset
+    import numpy as np
+
+    counts = counts.tocoo()
+    rows = counts.row + row_offset
+    p_joint = counts.data / total
+    pmi = np.log(p_joint / ((marginals[rows] / total) * (marginals[counts.col] / total)))
+    if measure == "npmi":
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pmi = np.where(p_joint < 1, pmi / -np.log(p_joint), 1.0)
+    elif measure == "count":
+        pmi = counts.data
+    return counts.row, counts.col, pmi, counts.data
+
+
+@tracked("cooccurrence")
+def cooccurrence_edges(documents, vocabulary, window=None, measure="npmi", top_k=10,
+                       min_pair_count=2, block_size=500):
+    """
+    Edges (term_a, term_b, weight, count) keeping the top_k strongest neighbours per term.
+    window=None counts document-level co-occurrence, otherwise pairs within 'window' tokens.
+    """
+    import numpy as np
+
+    size = len(vocabulary)
+    if window is None:
+        doc_terms = document_term_matrix(documents, vocabulary)
+        doc_terms_t = doc_terms.T.tocsr()
+        marginals = np.asarray(doc_terms.sum(axis=0)).ravel()
+        total = float(len(documents))
+
+        def block(start, end):
+            return doc_terms_t[start:end] @ doc_terms
+    else:
+        counts = window_cooccurrence(documents, vocabulary, window)
+        marginals = np.asarray(counts.sum(axis=1)).ravel()
+        total = float(marginals.sum())
+
+        def block(start, end):
+            return counts[start:end]
+
+    edges = {}
+    for start in range(0, size, block_size):
+        end = min(start + block_size, size)
+        with track("cooccurrence.block", f"{start}-{end}"):
+            block_counts = block(start, end).tocsr()
+            block_counts.setdiag(0, k=start)
+            block_counts.data[block_counts.data < min_pair_count] = 0
+            block_counts.eliminate_zeros()
+            if block_counts.nnz == 0:
+                continue
+
+            rows, cols, weights, pair_counts = _weight_block(block_counts, start, marginals, total, measure)
+
+            # Top-k per row: sort by (row, -weight) and keep the first k of each row
+            order = np.lexsort((-weights, rows))
+            rows, cols, weights, pair_counts = rows[order], cols[order], weights[order], pair_counts[order]
+            row_starts = np.searchsorted(rows, rows, side='left')
+            keep = (np.arange(len(rows)) - row_starts) < top_k
+            for row, col, weight, count in zip((rows[keep] + start).tolist(), cols[keep].tolist(),
+                                               weights[keep].tolist(), pair_counts[keep].tolist()):
+                key = (min(row, col), max(row, col))
+                edges[key] = (float(weight), int(count))
+
+    id2term = {i: term for term, i in vocabulary.items()}
+    return [(id2term[a], id2term[b], weight, count) for (a, b), (weight, count) in edges.items()]
+
+
+def topic_terms(results_file="lda_results.pkl", topn=20):
+    """term -> list of topics whose top 'topn' words contain it"""
+    with open(results_file, 'rb') as f:
+        results = pickle.load(f)
+    terms = {}
+    for topic_idx in range(results['num_topics']):
+        for word, _ in results['lda_model'].show_topic(topic_idx, topn=topn):
+            terms.setdefault(word, []).append(topic_idx)
+    return terms
+
+
+# === EXPORT ===
+
+def write_edges_csv(edges, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "target", "weight", "count"])
+        for source, target, weight, count in edges:
+            writer.writerow([source, target, f"{weight:.6f}", count])
+
+
+def _attribute(value):
+    # XML escaping for attribute values (xml.sax.saxutils pulls in urllib at import)
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def write_graphml(edges, term_counts, path, term_topics=None):
+    """GraphML with a 'frequency' (and 'topics') attribute per node and 'weight'/'count' per edge"""
+    nodes = sorted({term for edge in edges for term in edge[:2]})
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        f.write('  <key id="frequency" for="node" attr.name="frequency" attr.type="int"/>\n')
+        f.write('  <key id="topics" for="node" attr.name="topics" attr.type="string"/>\n')
+        f.write('  <key id="weight" for="edge" attr.name="weight" attr.type="double"/>\n')
+        f.write('  <key id="count" for="edge" attr.name="count" attr.type="int"/>\n')
+        f.write('  <graph id="cooccurrence" edgedefault="undirected">\n')
+        for term in nodes:
+            f.write(f'    <node id="{_attribute(term)}"><data key="frequency">{term_counts[term]}</data>')
+            if term_topics and term in term_topics:
+                f.write(f'<data key="topics">{",".join(map(str, term_topics[term]))}</data>')
+            f.write('</node>\n')
+        for source, target, weight, count in edges:
+            f.write(f'    <edge source="{_attribute(source)}" target="{_attribute(target)}">'
+                    f'<data key="weight">{weight:.6f}</data><data key="count">{count}</data></edge>\n')
+        f.write('  </graph>\n</graphml>\n')
+
+
+def draw_graph(edges, term_counts, path, term_topics=None, max_edges=300):
+    """Render the strongest edges as a network figure"""
+    import numpy as np
+
+    import matplotlib.pyplot as plt
+
+    edges = sorted(edges, key=lambda e: -e[2])[:max_edges]
+    nodes = sorted({term for edge in edges for term in edge[:2]})
+    if not nodes:
+        print("No edges to draw.")
+        return
+
+    try:
+        import networkx as nx
+        graph = nx.Graph()
+        graph.add_weighted_edges_from((a, b, max(w, 1e-3)) for a, b, w, _ in edges)
+        positions = nx.spring_layout(graph, weight='weight', seed=100)
+    except ImportError:
+        angles = np.linspace(0, 2 * math.pi, len(nodes), endpoint=False)
+        positions = {term: (math.cos(a), math.sin(a)) for term, a in zip(nodes, angles)}
+
+    fig, ax = plt.subplots(figsize=(14, 14))
+    max_weight = max(abs(e[2]) for e in edges) or 1.0
+    for source, target, weight, _ in edges:
+        (x1, y1), (x2, y2) = positions[source], positions[target]
+        ax.plot([x1, x2], [y1, y2], color='gray', alpha=0.2 + 0.6 * abs(weight) / max_weight,
+                linewidth=0.5 + 2 * abs(weight) / max_weight, zorder=1)
+
+    max_count = max(term_counts[term] for term in nodes)
+    for term in nodes:
+        x, y = positions[term]
+        topics = (term_topics or {}).get(term)
+        color = plt.cm.tab20(topics[0]) if topics else '#4ECDC4'
+        ax.scatter(x, y, s=50 + 600 * term_counts[term] / max_count, color=color, alpha=0.8,
+                   edgecolor='black', linewidth=0.5, zorder=2)
+        ax.text(x, y, term, fontsize=8, ha='center', va='center', zorder=3)
+
+    ax.set_title('Term Co-occurrence Graph', fontweight='bold', fontsize=14)
+    ax.axis('off')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    print(f"💾 Co-occurrence graph saved to '{path}'")
+
+
+def build_cooccurrence_graph(preprocessed_folder="preprocessed_articles_filtered", output_prefix="cooccurrence",
+                             window=None, measure="npmi", top_k=10, min_count=5, min_pair_count=2,
+                             max_terms=None, results_file=None, topn=20, draw=True):
+    """Build, prune and export the co-occurrence graph (GraphML, CSV and PNG)"""
+    print("Loading preprocessed documents...")
+    documents, _ = load_documents(preprocessed_folder)
+
+    term_topics = topic_terms(results_file, topn) if results_file else None
+    vocabulary, term_counts = build_vocabulary(documents, min_count, term_topics, max_terms)
+    mode = "document level" if window is None else f"window {window}"
+    print(f"Building co-occurrence graph ({mode}, {measure}) over {len(vocabulary)} terms...")
+
+    edges = cooccurrence_edges(documents, vocabulary, window, measure, top_k, min_pair_count)
+    print(f"Edges kept: {len(edges)}")
+
+    write_edges_csv(edges, f"{output_prefix}_edges.csv")
+    write_graphml(edges, term_counts, f"{output_prefix}.graphml", term_topics)
+    print(f"💾 Graph saved to '{output_prefix}.graphml' and '{output_prefix}_edges.csv'")
+    if draw:
+        draw_graph(edges, term_counts, f"{output_prefix}_graph.png", term_topics)
+    return edges
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sparse term co-occurrence graph builder.")
+    parser.add_argument("--folder", default="preprocessed_articles_filtered", help="Folder with token .txt files")
+    parser.add_argument("--output", default="cooccurrence", help="Prefix of the output files")
+    parser.add_argument("--window", type=int, help="Sliding window size in tokens (default: whole document)")
+    parser.add_argument("--measure", choices=["npmi", "pmi", "count"], default="npmi")
+    parser.add_argument("--top-k", type=int, default=10, help="Neighbours kept per term")
+    parser.add_argument("--min-count", type=int, default=5, help="Minimum term frequency")
+    parser.add_argument("--min-pair-count", type=int, default=2, help="Minimum co-occurrence count of an edge")
+    parser.add_argument("--max-terms", type=int, help="Only the most frequent terms")
+    parser.add_argument("--topics", help="lda_results.pkl: restrict the graph to the topics' top words")
+    parser.add_argument("--topn", type=int, default=20, help="Top words per topic used with --topics")
+    parser.add_argument("--no-figure", action="store_true", help="Skip rendering the PNG")
+    args = parser.parse_args()
+
+    build_cooccurrence_graph(args.folder, args.output, args.window, args.measure, args.top_k, args.min_count,
+                             args.min_pair_count, args.max_terms, args.topics, args.topn, not args.no_figure)
@@ -0,0 +1,355 @@
+import json
+import os
+import re
+import zlib
+
+from instrumentation import track, tracked
+
+# Near-duplicate documents and repeated boilerplate passages (legal disclaimers,
+# GRI index tables, year-over-year copies of the same report), found with
+# MinHash + LSH before the expensive translation, tagging and LDA stages.
+#
+# - Each document is split into passages (PDF lines joined until one ends a
+#   sentence or a blank line follows). Every passage gets a MinHash signature
+#   of its word shingles.
+# - The signature of a document is the element-wise minimum of its passage
+#   signatures, i.e. the MinHash of all its shingles.
+# - LSH (bands x rows of the signature) proposes candidates that share a bucket;
+#   they are confirmed on the estimated Jaccard similarity of the full signature.
+#
+# Modes:
+#   drop      near-duplicate documents and every copy of a boilerplate passage are removed
+#   collapse  one copy is kept: the longest document of each near-duplicate group
+#             and the first occurrence of each boilerplate passage
+#   weight    the text is not changed; dedup_weights.json gives every document
+#             1 / (size of its near-duplicate group) for the LDA training
+MODES = ("drop", "collapse", "weight")
+REPORT_FILE = "dedup_report.json"
+WEIGHTS_FILE = "dedup_weights.json"
+
+WORD_RE = re.compile(r"\w+")
+SENTENCE_END = (".", "!", "?", ":", ";")
+
+
+def split_passages(text):
+    """(start, end) character spans of the passages of a text"""
+    spans = []
+    start = None
+    position = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if not stripped:
+            if start is not None:
+                spans.append((start, position))
+                start = None
+        else:
+            if start is None:
+                start = position
+            if stripped.endswith(SENTENCE_END):
+                spans.append((start, position + len(line)))
+                start = None
+        position += len(line)
+
+    if start is not None:
+        spans.append((start, position))
+    return spans
+
+
+def minhash_parameters(num_perm=128, shingle_size=5, seed=1):
+    """Random odd multipliers for the shingle hash and the num_perm MinHash functions"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+
+    def odd(count):
+        return rng.integers(0, 2 ** 64, size=count, dtype=np.uint64, endpoint=False) | np.uint64(1)
+
+    return {"shingle": odd(shingle_size), "a": odd(num_perm),
+            "b": rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64, endpoint=False)}
+
+
+def minhash_signatures(passages, params, word_hashes):
+    """
+    uint32 MinHash signature (one row of num_perm values) per passage.
+    passages are lists of words; word_hashes caches the CRC32 of every word seen.
+    """
+    import numpy as np
+
+    shingle_size = len(params["shingle"])
+    shingles = []
+    starts = []
+    total = 0
+    for words in passages:
+        ids = np.array([word_hashes[w] if w in word_hashes else word_hashes.setdefault(w, zlib.crc32(w.encode('utf-8')))
+                        for w in words], dtype=np.uint64)
+        # Passages shorter than a shingle become one shingle of all their words
+        count = max(1, len(ids) - shingle_size + 1)
+        hashes = np.zeros(count, dtype=np.uint64)
+        for i in range(min(shingle_size, len(ids))):
+            hashes += ids[i:i + count] * params["shingle"][i]
+        shingles.append(hashes)
+        starts.append(total)
+        total += count
+
+    hashes = np.concatenate(shingles)
+    starts = np.array(starts)
+    signatures = np.empty((len(passages), len(params["a"])), dtype=np.uint32)
+    for column, (a, b) in enumerate(zip(params["a"], params["b"])):
+        values = ((hashes * a + b) >> np.uint64(32)).astype(np.uint32)
+        signatures[:, column] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def near_duplicate_labels(signatures, bands=16, threshold=0.8):
+    """
+    Group label of every signature row. Rows end up in the same group when their
+    estimated Jaccard similarity reaches threshold; only rows that share an LSH
+    bucket are compared, never the whole corpus pairwise.
+    """
+    import numpy as np
+
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    required = threshold * num_perm
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    multipliers = np.random.default_rng(0).integers(0, 2 ** 64, size=rows, dtype=np.uint64, endpoint=False) | np.uint64(1)
+    for band in range(bands):
+        # Hash of the band's rows; a rare collision only adds a candidate that gets verified
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1, dtype=np.uint64)
+        _, buckets, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        order = np.argsort(buckets, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(sizes)))
+
+        for bucket in np.flatnonzero(sizes > 1).tolist():
+            # Each member joins the first representative it matches, or becomes one
+            representatives = []
+            for i in order[bounds[bucket]:bounds[bucket + 1]].tolist():
+                for r in representatives:
+                    if find(i) == find(r) or np.count_nonzero(signatures[i] == signatures[r]) >= required:
+                        parent[find(i)] = find(r)
+                        break
+                else:
+                    representatives.append(i)
+
+    return [find(i) for i in range(count)]
+
+
+def _groups(labels):
+    # Indices of every group with more than one member
+    groups = {}
+    for i, label in enumerate(labels):
+        groups.setdefault(label, []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _without_spans(text, spans):
+    # Text with the given (sorted, non-overlapping) character spans cut out
+    pieces = []
+    position = 0
+    for start, end in sorted(spans):
+        pieces.append(text[position:start])
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def _write_if_changed(path, text):
+    # Only rewrite files whose content changed, so downstream stages can reuse the others
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return True
+
+
+@tracked("dedup")
+def deduplicate_corpus(input_folder="articles", output_folder="deduplicated_articles", mode="collapse",
+                       doc_threshold=0.9, passage_threshold=0.8, min_docs=3, min_words=8,
+                       num_perm=128, bands=16, shingle_size=5, seed=1):
+    """
+    Find near-duplicate documents and boilerplate passages (near-duplicate passages
+    of at least min_words words found in at least min_docs documents) and write the
+    deduplicated .txt files to output_folder.
+    Returns the report, also saved as dedup_report.json in output_folder.
+    """
+    import numpy as np
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode} (expected one of {', '.join(MODES)})")
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+
+    file_names = sorted(f for f in os.listdir(input_folder) if f.endswith(".txt"))
+    if not file_names:
+        print("No text files found in the input folder.")
+        return None
+
+    # === SIGNATURES ===
+    print(f"Hashing {len(file_names)} documents...")
+    params = minhash_parameters(num_perm, shingle_size, seed)
+    word_hashes = {}
+    texts = []
+    doc_signatures = np.full((len(file_names), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    passages = []              # (doc index, start, end) of the passages that can be boilerplate
+    passage_signatures = []
+
+    for doc_idx, filename in enumerate(file_names):
+        with track("dedup", filename) as metrics:
+            with open(os.path.join(input_folder, filename), 'r', encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            texts.append(text)
+
+            spans = []
+            words = []
+            for start, end in split_passages(text):
+                passage_words = WORD_RE.findall(text[start:end].lower())
+                if passage_words:
+                    spans.append((start, end))
+                    words.append(passage_words)
+
+            if spans:
+                signatures = minhash_signatures(words, params, word_hashes)
+                doc_signatures[doc_idx] = signatures.min(axis=0)
+                for span, passage_words, signature in zip(spans, words, signatures):
+                    if len(passage_words) >= min_words:
+                        passages.append((doc_idx, *span))
+                        passage_signatures.append(signature)
+            metrics.update(bytes_in=len(text), items=len(spans))
+
+    # === NEAR-DUPLICATE DOCUMENTS ===
+    # The longest document of each group represents it
+    print("Finding near-duplicate documents...")
+    duplicate_of = {}
+    group_size = {}
+    for members in _groups(near_duplicate_labels(doc_signatures, bands, doc_threshold)):
+        keep = max(members, key=lambda i: (len(texts[i]), -i))
+        for i in members:
+            group_size[i] = len(members)
+            if i != keep:
+                duplicate_of[i] = keep
+
+    # === BOILERPLATE PASSAGES ===
+    # Only copies in documents that are kept count towards min_docs
+    print("Finding boilerplate passages...")
+    removed = {}               # doc index -> spans cut out of it
+    boilerplate_groups = 0
+    if passages:
+        labels = near_duplicate_labels(np.array(passage_signatures), bands, passage_threshold)
+        for members in _groups(labels):
+            members = [m for m in members if passages[m][0] not in duplicate_of]
+            if len({passages[m][0] for m in members}) < min_docs:
+                continue
+            boilerplate_groups += 1
+            # Members are in corpus order, so members[0] is the first occurrence
+            for m in (members if mode == "drop" else members[1:]):
+                doc_idx, start, end = passages[m]
+                removed.setdefault(doc_idx, []).append((start, end))
+
+    # === OUTPUT ===
+    # In weight mode the spans above are only used to report what collapse would save
+    os.makedirs(output_folder, exist_ok=True)
+    totals = {"chars_in": 0, "chars_out": 0, "tokens_in": 0, "tokens_out": 0}
+    files = {}
+    excluded = []
+    changed = []
+    for doc_idx, filename in enumerate(file_names):
+        text = texts[doc_idx]
+        deduplicated = None if doc_idx in duplicate_of else _without_spans(text, removed.get(doc_idx, []))
+        totals["chars_in"] += len(text)
+        totals["tokens_in"] += len(text.split())
+        if deduplicated is not None:
+            totals["chars_out"] += len(deduplicated)
+            totals["tokens_out"] += len(deduplicated.split())
+
+        if doc_idx in duplicate_of or doc_idx in removed:
+            files[filename] = {"duplicate_of": file_names[duplicate_of[doc_idx]] if doc_idx in duplicate_of else None,
+                               "passages_removed": len(removed.get(doc_idx, [])),
+                               "chars_saved": len(text) - len(deduplicated or "")}
+
+        output_path = os.path.join(output_folder, filename)
+        if mode == "weight":
+            deduplicated = text
+        if deduplicated is None:
+            excluded.append(filename)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        elif _write_if_changed(output_path, deduplicated):
+            changed.append(filename)
+
+    weights_path = os.path.join(output_folder, WEIGHTS_FILE)
+    if mode == "weight":
+        weights = {filename: 1.0 / group_size.get(doc_idx, 1) for doc_idx, filename in enumerate(file_names)}
+        with open(weights_path, 'w', encoding='utf-8') as f:
+            json.dump(weights, f, indent=2, ensure_ascii=False)
+    elif os.path.exists(weights_path):
+        os.remove(weights_path)
+
+    saved_chars = totals["chars_in"] - totals["chars_out"]
+    saved_tokens = totals["tokens_in"] - totals["tokens_out"]
+    report = {
+        "mode": mode,
+        "documents": len(file_names),
+        "duplicate_documents": len(duplicate_of),
+        "boilerplate_groups": boilerplate_groups,
+        "passages_removed": sum(len(spans) for spans in removed.values()),
+        **totals,
+        # Nothing is removed in weight mode: these are then the savings collapse would give
+        "chars_saved": saved_chars if mode != "weight" else 0,
+        "tokens_saved": saved_tokens if mode != "weight" else 0,
+        "redundant_chars": saved_chars,
+        "redundant_tokens": saved_tokens,
+        "excluded": excluded,
+        "changed": changed,
+        "files": files,
+    }
+    with open(os.path.join(output_folder, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    # Print summary at the end
+    print("=" * 50)
+    print("DEDUPLICATION SUMMARY")
+    print("=" * 50)
+    print(f"Documents: {len(file_names)} ({len(duplicate_of)} near-duplicates, mode: {mode})")
+    print(f"Boilerplate passages: {boilerplate_groups} groups, {report['passages_removed']} copies")
+    share = 100.0 * saved_chars / max(1, totals["chars_in"])
+    if mode == "weight":
+        print(f"Redundant text (kept, down-weighted): {saved_chars:,} chars ({share:.1f}%), {saved_tokens:,} tokens")
+    else:
+        print(f"Characters: {totals['chars_in']:,} -> {totals['chars_out']:,} (saved {saved_chars:,}, {share:.1f}%)")
+        print(f"Tokens: {totals['tokens_in']:,} -> {totals['tokens_out']:,} (saved {saved_tokens:,})")
+    print(f"Report saved to '{os.path.join(output_folder, REPORT_FILE)}'")
+
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Near-duplicate and boilerplate removal with MinHash/LSH.")
+    parser.add_argument("--input", default="articles", help="Folder with the cleaned .txt files")
+    parser.add_argument("--output", default="deduplicated_articles")
+    parser.add_argument("--mode", choices=MODES, default="collapse")
+    parser.add_argument("--doc-threshold", type=float, default=0.9,
+                        help="Estimated Jaccard similarity for near-duplicate documents")
+    parser.add_argument("--passage-threshold", type=float, default=0.8,
+                        help="Estimated Jaccard similarity for repeated passages")
+    parser.add_argument("--min-docs", type=int, default=3, help="Documents a passage must repeat in to be boilerplate")
+    parser.add_argument("--min-words", type=int, default=8, help="Shorter passages are never boilerplate")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash signature length")
+    parser.add_argument("--bands", type=int, default=16, help="LSH bands (num-perm must be a multiple)")
+    parser.add_argument("--shingle-size", type=int, default=5, help="Words per shingle")
+    args = parser.parse_args()
+
+    deduplicate_corpus(args.input, args.output, args.mode, args.doc_threshold, args.passage_threshold,
+                       args.min_docs, args.min_words, args.num_perm, args.bands, args.shingle_size)
@@ -0,0 +1,250 @@
+import json
+import os
+import pickle
+import shutil
+from array import array
+from functools import lru_cache
+
+from instrumentation import track, tracked
+
+# Positional inverted index over the preprocessed corpus.
+# For every lemma it stores the documents, token positions (in the preprocessed
+# token stream) and character offsets (in the translated text) where it occurs,
+# so that keyword-in-context queries only touch the matching postings.
+#
+# Layout (one folder with an uncompressed .npy file per array, memory-mapped
+# when loaded so that a query only reads the pages of its own postings):
+#   terms        sorted vocabulary (prefix queries = one binary search)
+#   term_ptr     postings of terms[t] are [term_ptr[t], term_ptr[t + 1])
+#   post_doc     document id of each posting
+#   post_pos     token position inside the document
+#   post_offset  character offset in the translated text (-1 if unknown)
+#   doc_names    file name of each document id
+# plus index.json with the folders of the indexed files.
+ARRAYS = ["terms", "term_ptr", "post_doc", "post_pos", "post_offset", "doc_names"]
+
+
+@tracked("index")
+def build_index(preprocessed_folder="preprocessed_articles", translated_folder="translated_articles",
+                index_folder="innovation_index"):
+    """Build the positional index from the preprocessed .txt (+ .offsets) files"""
+    import numpy as np
+
+    doc_names = sorted(f for f in os.listdir(preprocessed_folder) if f.endswith(".txt"))
+    vocabulary = {}
+    term_ids = array('I')
+    doc_ids = array('I')
+    positions = array('I')
+    offsets = array('q')
+
+    print(f"Indexing {len(doc_names)} documents...")
+    for doc_id, filename in enumerate(doc_names):
+        with open(os.path.join(preprocessed_folder, filename), 'r', encoding='utf-8') as f:
+            tokens = f.read().split()
+
+        offsets_path = os.path.join(preprocessed_folder, os.path.splitext(filename)[0] + '.offsets')
+        doc_offsets = None
+        if os.path.exists(offsets_path):
+            with open(offsets_path, 'r', encoding='utf-8') as f:
+                doc_offsets = [int(offset) for offset in f.read().split()]
+            if len(doc_offsets) != len(tokens):
+                print(f"    WARNING: {filename} offsets do not match its tokens, ignoring them")
+                doc_offsets = None
+
+        term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+        doc_ids.extend([doc_id] * len(tokens))
+        positions.extend(range(len(tokens)))
+        offsets.extend(doc_offsets if doc_offsets is not None else [-1] * len(tokens))
+
+    # Renumber terms in sorted order, then sort postings by term (stable: keeps doc/position order)
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.uint32)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms), dtype=np.uint32)
+    sorted_term_ids = rank[np.frombuffer(term_ids, dtype=np.uint32)]
+    order = np.argsort(sorted_term_ids, kind='stable')
+    term_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sorted_term_ids, minlength=len(terms)), out=term_ptr[1:])
+
+    arrays = {
+        "terms": np.array(terms, dtype=str),
+        "term_ptr": term_ptr,
+        "post_doc": np.frombuffer(doc_ids, dtype=np.uint32)[order],
+        "post_pos": np.frombuffer(positions, dtype=np.uint32)[order],
+        "post_offset": np.frombuffer(offsets, dtype=np.int64)[order],
+        "doc_names": np.array(doc_names, dtype=str),
+    }
+    folders = {"preprocessed_folder": os.path.abspath(preprocessed_folder),
+               "translated_folder": os.path.abspath(translated_folder) if translated_folder else ""}
+
+    # Written to a temporary folder and renamed, so a crash never leaves a partial index
+    temporary = f"{index_folder}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for name in ARRAYS:
+        np.save(os.path.join(temporary, f"{name}.npy"), arrays[name])
+    with open(os.path.join(temporary, "index.json"), 'w', encoding='utf-8') as f:
+        json.dump(folders, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(index_folder, ignore_errors=True)
+    os.replace(temporary, index_folder)
+
+    print(f"Index saved to '{index_folder}': {len(terms)} terms, {len(order)} postings")
+    return index_folder
+
+
+def load_index(index_folder="innovation_index", results_file=None):
+    """
+    Open an index for querying: the arrays are memory-mapped, not read.
+    With results_file (lda_results.pkl) the dominant topic of every
+    document is attached for topic-conditioned queries.
+    """
+    import numpy as np
+
+    index = {name: np.load(os.path.join(index_folder, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+    with open(os.path.join(index_folder, "index.json"), 'r', encoding='utf-8') as f:
+        index.update(json.load(f))
+
+    dominant_topic = np.full(len(index["doc_names"]), -1, dtype=np.int32)
+    if results_file:
+        with open(results_file, 'rb') as f:
+            results = pickle.load(f)
+        doc_ids = {name: doc_id for doc_id, name in enumerate(index["doc_names"])}
+        for _, topic, filename in results['topic_distribution']:
+            if filename in doc_ids:
+                dominant_topic[doc_ids[filename]] = topic
+    index["dominant_topic"] = dominant_topic
+    return index
+
+
+def term_range(index, term):
+    """
+    Range of term ids matching term; a trailing '*' makes it a prefix query
+    (e.g. 'innova*' matches innovación, innovador, innovar...)
+    """
+    import numpy as np
+
+    terms = index["terms"]
+    if term.endswith("*"):
+        prefix = term[:-1]
+        start, end = np.searchsorted(terms, [prefix, prefix + "\U0010ffff"])
+        return int(start), int(end)
+
+    start = int(np.searchsorted(terms, term))
+    if start < len(terms) and terms[start] == term:
+        return start, start + 1
+    return start, start
+
+
+def postings(index, term, topic=None):
+    """(doc ids, positions, offsets) of all occurrences, optionally only in documents whose dominant topic is 'topic'"""
+    import numpy as np
+
+    start, end = term_range(index, term)
+    ptr = index["term_ptr"]
+    slices = [slice(ptr[t], ptr[t + 1]) for t in range(start, end)]
+    docs = np.concatenate([index["post_doc"][s] for s in slices]) if slices else np.array([], dtype=np.uint32)
+    positions = np.concatenate([index["post_pos"][s] for s in slices]) if slices else np.array([], dtype=np.uint32)
+    offsets = np.concatenate([index["post_offset"][s] for s in slices]) if slices else np.array([], dtype=np.int64)
+
+    if len(slices) > 1:
+        # Prefix queries merge several terms: restore document/position order
+        order = np.lexsort((positions, docs))
+        docs, positions, offsets = docs[order], positions[order], offsets[order]
+
+    if topic is not None:
+        keep = index["dominant_topic"][docs] == topic
+        docs, positions, offsets = docs[keep], positions[keep], offsets[keep]
+
+    return docs, positions, offsets
+
+
+def document_counts(index, term, topic=None):
+    """[(file name, occurrences)] sorted by count, descending"""
+    import numpy as np
+
+    docs, _, _ = postings(index, term, topic)
+    doc_ids, counts = np.unique(docs, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return [(str(index["doc_names"][doc_ids[i]]), int(counts[i])) for i in order]
+
+
+def topic_hits(index, term, topic):
+    """Documents whose dominant topic is 'topic' and that contain term, with counts"""
+    return document_counts(index, term, topic)
+
+
+@lru_cache(maxsize=256)
+def _read_tokens(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().split()
+
+
+@lru_cache(maxsize=256)
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def kwic(index, term, window=5, limit=20, topic=None, context_chars=80):
+    """
+    Keyword-in-context hits: the lemma window around each occurrence and,
+    when offsets are known, the surrounding passage of the translated text.
+    Only the files of the returned hits are read.
+    """
+    docs, positions, offsets = postings(index, term, topic)
+    hits = []
+    for doc_id, position, offset in zip(docs[:limit].tolist(), positions[:limit].tolist(), offsets[:limit].tolist()):
+        filename = str(index["doc_names"][doc_id])
+        tokens = _read_tokens(os.path.join(index["preprocessed_folder"], filename))
+        hit = {
+            "document": filename,
+            "position": position,
+            "left": " ".join(tokens[max(0, position - window):position]),
+            "keyword": tokens[position],
+            "right": " ".join(tokens[position + 1:position + 1 + window]),
+            "offset": offset,
+        }
+        translated_path = os.path.join(index["translated_folder"], filename)
+        if offset >= 0 and index["translated_folder"] and os.path.exists(translated_path):
+            text = _read_text(translated_path)
+            hit["source"] = " ".join(text[max(0, offset - context_chars):offset + context_chars].split())
+        hits.append(hit)
+    return hits
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Positional index with keyword-in-context queries.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Build the index from preprocessed files")
+    build_parser.add_argument("--preprocessed", default="preprocessed_articles")
+    build_parser.add_argument("--translated", default="translated_articles")
+    build_parser.add_argument("--index", default="innovation_index", help="Index folder")
+
+    query_parser = commands.add_parser("query", help="Query a term (use a trailing * for a prefix, e.g. innova*)")
+    query_parser.add_argument("term")
+    query_parser.add_argument("--index", default="innovation_index", help="Index folder")
+    query_parser.add_argument("--results", help="lda_results.pkl, needed for --topic")
+    query_parser.add_argument("--topic", type=int, help="Only documents whose dominant topic is this one")
+    query_parser.add_argument("--window", type=int, default=5, help="Lemmas shown on each side")
+    query_parser.add_argument("--limit", type=int, default=20, help="Maximum keyword-in-context lines")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.preprocessed, args.translated, args.index)
+    else:
+        index = load_index(args.index, args.results)
+        with track("index.query", args.term):
+            counts = document_counts(index, args.term, args.topic)
+            hits = kwic(index, args.term, args.window, args.limit, args.topic)
+
+        print(f"'{args.term}': {sum(c for _, c in counts)} occurrences in {len(counts)} documents")
+        print("-" * 60)
+        for filename, count in counts[:20]:
+            print(f"   {filename}: {count}")
+        print("-" * 60)
+        for hit in hits:
+            print(f"{hit['document'][:25]:<25} {hit['left']:>45} [{hit['keyword']}] {hit['right']}")
+            if "source" in hit:
+                print(f"{'':<25}   ... {hit['source']} ...")
@@ -0,0 +1,277 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+# Shared JSON-lines metrics for every stage.
+# Configuration lives in environment variables so that worker processes
+# started by the pipeline inherit it:
+#   PIPELINE_METRICS      file that receives one JSON event per line (unset = disabled)
+#   PIPELINE_PROFILE      comma-separated stages to profile, or "all"
+#   PIPELINE_PROFILE_DIR  folder for the cProfile .prof dumps (default: "profiles")
+METRICS_ENV = "PIPELINE_METRICS"
+PROFILE_ENV = "PIPELINE_PROFILE"
+PROFILE_DIR_ENV = "PIPELINE_PROFILE_DIR"
+
+_lock = threading.Lock()
+_sink = {"path": None, "file": None, "pid": None}
+# tracemalloc is process-wide: it runs while at least one profiled unit of this process does
+_tracing = {"units": 0, "started": False}
+
+
+def configure(metrics_file=None, profile=None, profile_dir=None):
+    """Enable metrics (and optionally profiling) for this process and its workers"""
+    if metrics_file is not None:
+        os.environ[METRICS_ENV] = str(Path(metrics_file).resolve())
+    if profile is not None:
+        os.environ[PROFILE_ENV] = profile if isinstance(profile, str) else ",".join(profile)
+    if profile_dir is not None:
+        os.environ[PROFILE_DIR_ENV] = str(Path(profile_dir).resolve())
+
+
+def enabled():
+    return bool(os.environ.get(METRICS_ENV))
+
+
+def _profiled(stage):
+    stages = os.environ.get(PROFILE_ENV, "")
+    if not stages:
+        return False
+    selected = {s.strip() for s in stages.split(",")}
+    # "model" also selects sub-steps such as "model.train"
+    return "all" in selected or stage in selected or stage.split(".")[0] in selected
+
+
+def _peak_rss():
+    # Peak resident set size over the whole life of this process in bytes (ru_maxrss is
+    # KB on Linux, bytes on macOS): in a long-lived pool worker it is the highest so far
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss():
+    # Current resident set size in bytes (Linux only, None elsewhere)
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _start_tracing():
+    import tracemalloc
+
+    with _lock:
+        if _tracing["units"] == 0:
+            # Tracing started elsewhere (e.g. python -X tracemalloc) is left running
+            _tracing["started"] = not tracemalloc.is_tracing()
+            if _tracing["started"]:
+                tracemalloc.start()
+            else:
+                # Only reset the peak when no other unit is being traced
+                tracemalloc.reset_peak()
+        _tracing["units"] += 1
+
+
+def _stop_tracing():
+    import tracemalloc
+
+    with _lock:
+        _tracing["units"] -= 1
+        if _tracing["units"] == 0 and _tracing["started"]:
+            tracemalloc.stop()
+            _tracing["started"] = False
+
+
+def _memory_profile():
+    # Traced peak and top allocation sites; units that overlap (thread pools) share them
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    return {
+        "traced_peak_bytes": tracemalloc.get_traced_memory()[1],
+        "top_allocations": [{"where": str(stat.traceback), "bytes": stat.size}
+                            for stat in snapshot.statistics("lineno")[:5]],
+    }
+
+
+def emit(event, **fields):
+    """Write one JSON event line (no-op when metrics are disabled)"""
+    path = os.environ.get(METRICS_ENV)
+    if not path:
+        return
+
+    record = {"ts": round(time.time(), 3), "event": event, "pid": os.getpid()}
+    record.update(fields)
+    line = json.dumps(record, default=str) + "\n"
+
+    with _lock:
+        # Reopen after a fork or a reconfiguration
+        if _sink["file"] is None or _sink["path"] != path or _sink["pid"] != os.getpid():
+            if _sink["file"] is not None and _sink["pid"] == os.getpid():
+                _sink["file"].close()
+            _sink.update(path=path, file=open(path, 'a', encoding='utf-8'), pid=os.getpid())
+        _sink["file"].write(line)
+        _sink["file"].flush()
+
+
+@contextmanager
+def track(stage, item=None, **fields):
+    """
+    Time one unit of work (a file, a chunk, a whole stage) and emit a "unit" event.
+    The yielded dict can be filled with bytes_in, bytes_out, items or any other field.
+    """
+    record = dict(fields)
+    if not enabled():
+        yield record
+        return
+
+    profiler = None
+    profiling = _profiled(stage)
+    if profiling:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active at a time (e.g. another thread of the same pool)
+            profiler = None
+        _start_tracing()
+
+    start_rss = _current_rss()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    start_thread_cpu = time.thread_time()
+    status = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        status = "error"
+        record["error"] = str(e)
+        raise
+    finally:
+        record.update(
+            stage=stage,
+            item=item,
+            status=status,
+            wall_s=round(time.perf_counter() - start_wall, 6),
+            cpu_s=round(time.process_time() - start_cpu, 6),
+            thread_cpu_s=round(time.thread_time() - start_thread_cpu, 6),
+            process_peak_rss_bytes=_peak_rss(),
+        )
+        # Growth of the process memory during the unit (units that overlap in a thread pool share it)
+        end_rss = _current_rss()
+        record["rss_delta_bytes"] = end_rss - start_rss if start_rss is not None and end_rss is not None else None
+
+        # Profiling bookkeeping must never turn the unit's own outcome into an error
+        if profiling:
+            try:
+                record.update(_memory_profile())
+            except Exception as e:
+                record["profile_error"] = str(e)
+            finally:
+                _stop_tracing()
+
+        if profiler is not None:
+            try:
+                profiler.disable()
+                profile_dir = Path(os.environ.get(PROFILE_DIR_ENV, "profiles"))
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                name = f"{stage}-{item or 'all'}-{os.getpid()}.prof".replace("/", "_").replace("\\", "_")
+                profiler.dump_stats(profile_dir / name)
+                record["profile"] = str(profile_dir / name)
+            except Exception as e:
+                record["profile_error"] = str(e)
+
+        emit("unit", **record)
+
+
+def tracked(stage):
+    """Decorator: track a whole folder-level run as one "<stage>.run" unit"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(f"{stage}.run", func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def file_size(path):
+    """Size of a file in bytes, 0 if it does not exist"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def summarize(metrics_file, top=10):
+    """Print the time spent per stage and the slowest documents from a metrics file"""
+    stages = {}
+    units = []
+    with open(metrics_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("event") != "unit" or event["stage"].endswith(".run"):
+                continue
+            totals = stages.setdefault(event["stage"], {"units": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                        "bytes_in": 0, "bytes_out": 0, "peak_rss_bytes": 0,
+                                                        "max_rss_delta_bytes": 0})
+            totals["units"] += 1
+            totals["wall_s"] += event["wall_s"]
+            totals["cpu_s"] += event["cpu_s"]
+            totals["bytes_in"] += event.get("bytes_in") or 0
+            totals["bytes_out"] += event.get("bytes_out") or 0
+            # peak_rss_bytes: metrics files written before it was named process_peak_rss_bytes
+            process_peak = event.get("process_peak_rss_bytes", event.get("peak_rss_bytes"))
+            totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], process_peak or 0)
+            totals["max_rss_delta_bytes"] = max(totals["max_rss_delta_bytes"], event.get("rss_delta_bytes") or 0)
+            units.append(event)
+
+    # peak MB: highest process peak RSS, max +MB: largest RSS growth during one unit
+    print("=" * 88)
+    print(f"{'stage':<18} {'units':>7} {'wall s':>10} {'cpu s':>10} {'MB in':>9} {'MB out':>9} {'peak MB':>9} "
+          f"{'max +MB':>9}")
+    print("=" * 88)
+    for stage, totals in sorted(stages.items(), key=lambda kv: -kv[1]["wall_s"]):
+        print(f"{stage:<18} {totals['units']:>7} {totals['wall_s']:>10.1f} {totals['cpu_s']:>10.1f} "
+              f"{totals['bytes_in'] / 1e6:>9.1f} {totals['bytes_out'] / 1e6:>9.1f} "
+              f"{totals['peak_rss_bytes'] / 1e6:>9.1f} {totals['max_rss_delta_bytes'] / 1e6:>9.1f}")
+
+    print(f"\nSlowest {top} units:")
+    print("-" * 88)
+    for event in sorted(units, key=lambda e: -e["wall_s"])[:top]:
+        print(f"{event['wall_s']:>10.2f}s  {event['stage']:<18} {event.get('item')}")
+
+    print(f"\nLargest memory growth, {top} units:")
+    print("-" * 88)
+    for event in sorted(units, key=lambda e: -(e.get("rss_delta_bytes") or 0))[:top]:
+        print(f"{(event.get('rss_delta_bytes') or 0) / 1e6:>9.1f}MB  {event['stage']:<18} {event.get('item')}")
+
+    return stages
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a JSON-lines metrics file.")
+    parser.add_argument("metrics_file")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest units to show")
+    args = parser.parse_args()
+
+    summarize(args.metrics_file, args.top)
@@ -1,17 +1,17 @@
 import os
-import gensim
-import gensim.corpora as corpora
-from gensim.models import CoherenceModel
 from collections import Counter
+import hashlib
+import json
 import pickle
+import shutil
 
+from instrumentation import track, tracked
 
-def run_lda_analysis():
-    # Run LDA analysis and save results for visualization
-    print("Loading preprocessed documents...")
+
+def load_documents(preprocessed_folder):
+    # Load token lists from the preprocessed .txt files (empty files are skipped)
     documents = []
     file_names = []
-    preprocessed_folder = "preprocessed_articles"
 
     for filename in os.listdir(preprocessed_folder):
         if filename.endswith(".txt"):
@@ -23,34 +23,264 @@ def run_lda_analysis():
                     documents.append(tokens)
                     file_names.append(filename)
 
-    print(f"Loaded {len(documents)} documents.")
+    return documents, file_names
+
+
+def build_corpus(documents, no_below=5, no_above=0.4):
+    # Create the filtered dictionary and the bag-of-words corpus
+    import gensim.corpora as corpora
 
-    # Create dictionary and corpus
-    print("🔨 Creating dictionary and corpus...")
     id2word = corpora.Dictionary(documents)
-    id2word.filter_extremes(no_below=5, no_above=0.4)
+    id2word.filter_extremes(no_below=no_below, no_above=no_above)
     corpus = [id2word.doc2bow(text) for text in documents]
+    return id2word, corpus
 
-    print(f"Dictionary: {len(id2word)} unique words")
-    print(f"Corpus: {len(corpus)} documents")
 
-    # Train LDA model
-    num_topics = 6
-    print(f"Training LDA model with {num_topics} topics...")
+def weight_corpus(corpus, file_names, weights_file):
+    # Scale the word counts of every document by its weight (dedup_weights.json,
+    # 1 / size of its near-duplicate group); documents not listed keep weight 1
+    with open(weights_file, 'r', encoding='utf-8') as f:
+        weights = json.load(f)
+    doc_weights = [weights.get(name, 1.0) for name in file_names]
+    weighted = [[(word_id, count * w) for word_id, count in doc_bow] if w != 1.0 else doc_bow
+                for doc_bow, w in zip(corpus, doc_weights)]
+    return weighted, sum(1 for w in doc_weights if w < 1.0)
+
 
-    lda_model = gensim.models.ldamodel.LdaModel(
+def train_lda_model(corpus, id2word, num_topics=6, passes=50, random_state=100, callbacks=None):
+    # Train the LDA model with the study parameters (corpus=None: untrained model)
+    from gensim.models.ldamodel import LdaModel
+
+    return LdaModel(
         corpus=corpus,
         id2word=id2word,
         num_topics=num_topics,
-        random_state=100,
-        passes=50,
+        random_state=random_state,
+        passes=passes,
         alpha='auto',
         eta='auto',
-        per_word_topics=True
+        per_word_topics=True,
+        callbacks=callbacks
     )
 
-    # Compute coherence
-    print("Computing coherence score...")
+
+# === CHECKPOINTED TRAINING ===
+# Checkpoints are folders <checkpoint_dir>/pass_NNNN with the saved model and a
+# checkpoint.json (passes done, convergence history). Only the latest is kept.
+CONVERGENCE_TOLERANCE = {"topics": 0.005, "perplexity": 0.001}
+
+
+class TrainingConverged(Exception):
+    pass
+
+
+class TrainingMonitor:
+    """
+    gensim training callback, called after every pass: saves a checkpoint every
+    checkpoint_every passes and stops training (TrainingConverged) once the
+    convergence signal stays below the tolerance for 'patience' passes.
+      topics      share of the topic-term probability mass that moved in the pass
+      perplexity  relative improvement of the held-out perplexity
+    """
+    logger = None  # no gensim shell / visdom output
+
+    def __init__(self, passes, start_pass=0, checkpoint_dir=None, checkpoint_every=5, convergence="topics",
+                 tolerance=None, patience=2, min_passes=10, holdout_corpus=None, fingerprint=None, history=None):
+        self.passes = passes
+        self.passes_done = start_pass
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.convergence = convergence
+        self.tolerance = CONVERGENCE_TOLERANCE.get(convergence) if tolerance is None else tolerance
+        self.patience = patience
+        self.min_passes = min_passes
+        self.holdout_corpus = holdout_corpus
+        self.fingerprint = fingerprint
+        self.history = list(history or [])
+        self.previous = None
+        self.stopped = None
+
+    def __str__(self):
+        return f"{self.convergence or 'no'} convergence"
+
+    def start(self, lda_model, resumed=False):
+        self.previous = self.signal(lda_model)
+        if resumed:
+            # gensim counts the documents of every chunk of the first pass of a training
+            # call as new updates, which changes the learning rate of the following chunks:
+            # a resumed run keeps num_updates fixed, like the later passes of an uninterrupted one
+            do_mstep = lda_model.do_mstep
+
+            def pinned_mstep(rho, other, extra_pass=False):
+                return do_mstep(rho, other, extra_pass=True)
+
+            lda_model.do_mstep = pinned_mstep
+
+    def signal(self, lda_model):
+        import numpy as np
+
+        if self.convergence == "topics":
+            return lda_model.get_topics()
+        if self.convergence == "perplexity":
+            return float(np.exp2(-lda_model.log_perplexity(self.holdout_corpus)))
+        return None
+
+    def improvement(self, current):
+        import numpy as np
+
+        if self.convergence == "topics":
+            return float(0.5 * np.abs(current - self.previous).sum(axis=1).mean())
+        return (self.previous - current) / self.previous
+
+    def get_value(self, model=None, **kwargs):
+        self.passes_done += 1
+
+        value = None
+        if self.convergence:
+            current = self.signal(model)
+            value = self.improvement(current)
+            self.previous = current
+            self.history.append(round(value, 6))
+            print(f"    pass {self.passes_done}/{self.passes}: {self.convergence} change {value:.5f}")
+
+            recent = self.history[-self.patience:]
+            if (self.passes_done >= self.min_passes and len(recent) == self.patience
+                    and all(v < self.tolerance for v in recent)):
+                self.stopped = "converged"
+
+        if self.passes_done == self.passes and self.stopped is None:
+            self.stopped = "max_passes"
+        if self.checkpoint_dir and (self.stopped or self.passes_done % self.checkpoint_every == 0):
+            self.save(model)
+        if self.stopped == "converged":
+            raise TrainingConverged()
+        return value
+
+    def save(self, lda_model):
+        # Written to a temporary folder and renamed, so a crash never leaves a partial checkpoint
+        final = os.path.join(self.checkpoint_dir, f"pass_{self.passes_done:04d}")
+        temporary = final + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        callbacks, lda_model.callbacks = lda_model.callbacks, None
+        pinned_mstep = lda_model.__dict__.pop("do_mstep", None)
+        try:
+            lda_model.save(os.path.join(temporary, "lda.model"))
+        finally:
+            lda_model.callbacks = callbacks
+            if pinned_mstep is not None:
+                lda_model.do_mstep = pinned_mstep
+        with open(os.path.join(temporary, "checkpoint.json"), 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": self.fingerprint, "passes_done": self.passes_done, "stopped": self.stopped,
+                       "history": self.history}, f, indent=2)
+
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(temporary, final)
+        for name in os.listdir(self.checkpoint_dir):
+            if name.startswith("pass_") and name != os.path.basename(final):
+                shutil.rmtree(os.path.join(self.checkpoint_dir, name), ignore_errors=True)
+
+
+def latest_checkpoint(checkpoint_dir, fingerprint):
+    # (folder, checkpoint.json content) of the newest checkpoint of this training, or None
+    if not checkpoint_dir or not os.path.isdir(checkpoint_dir):
+        return None
+    for name in sorted(os.listdir(checkpoint_dir), reverse=True):
+        meta_path = os.path.join(checkpoint_dir, name, "checkpoint.json")
+        if name.startswith("pass_") and not name.endswith(".tmp") and os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["fingerprint"] == fingerprint:
+                return os.path.join(checkpoint_dir, name), meta
+            print(f"    Ignoring checkpoint {name}: it belongs to a different corpus or configuration")
+    return None
+
+
+def train_lda_checkpointed(corpus, id2word, num_topics=6, passes=50, random_state=100, checkpoint_dir=None,
+                           checkpoint_every=5, convergence="topics", tolerance=None, patience=2, min_passes=10,
+                           holdout=0.1):
+    """
+    train_lda_model with checkpoints every checkpoint_every passes, resumed from the
+    latest checkpoint in checkpoint_dir, and early stopping on the convergence signal
+    ("topics", "perplexity" on every 1/holdout-th document kept out of training, or None).
+    Returns (lda_model, training) where training records the passes requested and used.
+    """
+    from gensim.models.ldamodel import LdaModel
+
+    # A checkpoint is only resumed by a training with the same corpus content and parameters
+    content = hashlib.sha256()
+    for token_id, token in sorted(id2word.items()):
+        content.update(f"{token_id}:{token}\n".encode('utf-8'))
+    for doc_bow in corpus:
+        content.update((" ".join(f"{token_id}:{count!r}" for token_id, count in doc_bow) + "\n").encode('utf-8'))
+    fingerprint = {
+        "corpus": content.hexdigest(), "num_topics": num_topics, "passes": passes, "random_state": random_state,
+        "convergence": convergence, "holdout": holdout if convergence == "perplexity" else None,
+        "tolerance": CONVERGENCE_TOLERANCE.get(convergence) if tolerance is None else tolerance,
+        "patience": patience, "min_passes": min_passes,
+    }
+
+    holdout_corpus = None
+    if convergence == "perplexity":
+        step = max(2, round(1 / holdout))
+        holdout_corpus = corpus[::step]
+        corpus = [doc_bow for i, doc_bow in enumerate(corpus) if i % step]
+        print(f"Perplexity convergence: {len(holdout_corpus)} documents are held out of training")
+
+    checkpoint = latest_checkpoint(checkpoint_dir, fingerprint)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    if checkpoint is None:
+        monitor = TrainingMonitor(passes, 0, checkpoint_dir, checkpoint_every, convergence, tolerance, patience,
+                                  min_passes, holdout_corpus, fingerprint)
+        lda_model = train_lda_model(None, id2word, num_topics, passes, random_state, callbacks=[monitor])
+        monitor.start(lda_model)
+    else:
+        folder, meta = checkpoint
+        print(f"Resuming from checkpoint after pass {meta['passes_done']}")
+        monitor = TrainingMonitor(passes, meta["passes_done"], checkpoint_dir, checkpoint_every, convergence,
+                                  tolerance, patience, min_passes, holdout_corpus, fingerprint, meta["history"])
+        monitor.stopped = meta["stopped"]
+        lda_model = LdaModel.load(os.path.join(folder, "lda.model"))
+        lda_model.callbacks = [monitor]
+        monitor.start(lda_model, resumed=True)
+
+    remaining = passes - monitor.passes_done
+    if remaining > 0 and monitor.stopped != "converged":
+        monitor.stopped = None
+        # The pass number continues the learning-rate decay of the interrupted run
+        update_args = {"offset": lda_model.offset + monitor.passes_done} if monitor.passes_done else {}
+        if monitor.passes_done:
+            lda_model.state.numdocs = 0
+        try:
+            lda_model.update(corpus, passes=remaining, **update_args)
+        except TrainingConverged:
+            pass
+    lda_model.callbacks = None
+    lda_model.__dict__.pop("do_mstep", None)
+
+    training = {
+        "passes_requested": passes,
+        "passes_used": monitor.passes_done,
+        "stopped": monitor.stopped or "max_passes",
+        "convergence": convergence,
+        "tolerance": monitor.tolerance,
+        "resumed_from": checkpoint[1]["passes_done"] if checkpoint else 0,
+        # Perplexity convergence trains on all documents but the held-out ones
+        "documents_trained": len(corpus),
+        "documents_held_out": len(holdout_corpus) if holdout_corpus is not None else 0,
+        "history": monitor.history,
+    }
+    print(f"Training used {training['passes_used']} of {passes} passes ({training['stopped']})")
+    return lda_model, training
+
+
+def compute_coherence(lda_model, documents, id2word):
+    # c_v coherence of the trained model
+    from gensim.models import CoherenceModel
+
     coherence_model = CoherenceModel(
         model=lda_model,
         texts=documents,
@@ -58,11 +288,15 @@ def run_lda_analysis():
         coherence='c_v',
         processes=1
     )
-    coherence_score = coherence_model.get_coherence()
-    print(f'Coherence Score: {coherence_score:.4f}')
+    return coherence_model.get_coherence()
+
+
+def document_topics(lda_model, corpus, file_names, top_k=None):
+    # Full topic distribution per document + (index, dominant topic, file name)
+    # With top_k only the top_k topics of each document are kept (sparse_document_topics)
+    if top_k:
+        return sparse_document_topics(lda_model, corpus, file_names, top_k)
 
-    # Get document-topic distributions
-    print("Calculating document-topic distributions...")
     topic_matrix = []
     for doc_bow in corpus:
         topic_dist = lda_model.get_document_topics(doc_bow, minimum_probability=0)
@@ -79,6 +313,126 @@ def run_lda_analysis():
         else:
             topic_distribution.append((i, -1, file_names[i]))
 
+    return topic_matrix, topic_distribution
+
+
+def sparse_document_topics(lda_model, corpus, file_names, top_k=5, minimum_probability=0.01):
+    # Document-topic matrix as a float32 CSR matrix holding only the top_k topics
+    # (above minimum_probability) of each document + (index, dominant topic, file name)
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    indptr = [0]
+    indices = []
+    weights = []
+    for doc_bow in corpus:
+        topic_probs = lda_model.get_document_topics(doc_bow, minimum_probability=minimum_probability)
+        top = sorted(sorted(topic_probs, key=lambda x: -x[1])[:top_k])
+        indices.extend(topic_id for topic_id, _ in top)
+        weights.extend(prob for _, prob in top)
+        indptr.append(len(indices))
+
+    topic_matrix = csr_matrix((np.array(weights, dtype=np.float32), np.array(indices, dtype=np.int32),
+                               np.array(indptr, dtype=np.int64)), shape=(len(corpus), lda_model.num_topics))
+    topic_distribution = [(i, topic, file_names[i]) for i, topic in enumerate(dominant_topics(topic_matrix))]
+    return topic_matrix, topic_distribution
+
+
+# === DOCUMENT-TOPIC MATRIX HELPERS ===
+# They accept the dense matrix (list of lists / array) and the sparse top-k CSR matrix
+
+def is_sparse(topic_matrix):
+    return hasattr(topic_matrix, "tocsr")
+
+
+def dense_topic_matrix(topic_matrix):
+    # Only meant for a few rows (e.g. the documents shown in a chart)
+    import numpy as np
+    return topic_matrix.toarray() if is_sparse(topic_matrix) else np.asarray(topic_matrix)
+
+
+def dominant_topics(topic_matrix):
+    # Dominant topic of every document, -1 when a sparse row stores no topic
+    import numpy as np
+
+    if not is_sparse(topic_matrix):
+        return np.asarray(topic_matrix).argmax(axis=1).tolist()
+    dominant = np.asarray(topic_matrix.argmax(axis=1)).ravel()
+    dominant[np.diff(topic_matrix.indptr) == 0] = -1
+    return dominant.tolist()
+
+
+def topic_importance(topic_matrix):
+    # Average probability of every topic across documents
+    import numpy as np
+
+    if is_sparse(topic_matrix):
+        return np.asarray(topic_matrix.mean(axis=0)).ravel()
+    return np.asarray(topic_matrix).mean(axis=0)
+
+
+def topic_correlation(topic_matrix):
+    # Pearson correlation between topics (same result as np.corrcoef(topic_matrix.T)),
+    # computed from the K x K Gram matrix so a sparse matrix is never densified
+    import numpy as np
+
+    if not is_sparse(topic_matrix):
+        return np.corrcoef(np.asarray(topic_matrix).T)
+
+    count = topic_matrix.shape[0]
+    mean = topic_importance(topic_matrix).astype(np.float64)
+    gram = (topic_matrix.T @ topic_matrix).toarray().astype(np.float64)
+    covariance = gram / count - np.outer(mean, mean)
+    std = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.clip(covariance / np.outer(std, std), -1, 1)
+
+
+@tracked("model")
+def run_lda_analysis(preprocessed_folder="preprocessed_articles", results_file='lda_results.pkl', weights_file=None,
+                     checkpoint_dir=None, checkpoint_every=5, convergence=None, top_k=None):
+    # Run LDA analysis and save results for visualization
+    # weights_file (from dedup.py --mode weight) down-weights near-duplicate documents in training
+    # With checkpoint_dir, training is checkpointed there and resumed after a crash; with
+    # convergence ("topics" or "perplexity") it stops early instead of running all 50 passes
+    # top_k stores only the top_k topics per document (sparse CSR topic_matrix)
+    print("Loading preprocessed documents...")
+    documents, file_names = load_documents(preprocessed_folder)
+
+    print(f"Loaded {len(documents)} documents.")
+
+    # Create dictionary and corpus
+    print("🔨 Creating dictionary and corpus...")
+    id2word, corpus = build_corpus(documents)
+
+    print(f"Dictionary: {len(id2word)} unique words")
+    print(f"Corpus: {len(corpus)} documents")
+
+    training_corpus = corpus
+    if weights_file:
+        training_corpus, down_weighted = weight_corpus(corpus, file_names, weights_file)
+        print(f"Down-weighted {down_weighted} near-duplicate documents")
+
+    # Train LDA model
+    num_topics = 6
+    print(f"Training LDA model with {num_topics} topics...")
+    with track("model.train", items=len(corpus), vocabulary=len(id2word)) as metrics:
+        lda_model, training = train_lda_checkpointed(training_corpus, id2word, num_topics,
+                                                     checkpoint_dir=checkpoint_dir,
+                                                     checkpoint_every=checkpoint_every,
+                                                     convergence=convergence)
+        metrics.update(passes_requested=training["passes_requested"], passes_used=training["passes_used"])
+
+    # Compute coherence
+    print("Computing coherence score...")
+    with track("model.coherence", items=len(documents)):
+        coherence_score = compute_coherence(lda_model, documents, id2word)
+    print(f'Coherence Score: {coherence_score:.4f}')
+
+    # Get document-topic distributions
+    print("Calculating document-topic distributions...")
+    topic_matrix, topic_distribution = document_topics(lda_model, corpus, file_names, top_k)
+
     # Save results for visualization
     results = {
         'lda_model': lda_model,
@@ -89,13 +443,14 @@ def run_lda_analysis():
         'topic_matrix': topic_matrix,
         'topic_distribution': topic_distribution,
         'coherence_score': coherence_score,
-        'num_topics': num_topics
+        'num_topics': num_topics,
+        'training': training
     }
 
-    with open('lda_results.pkl', 'wb') as f:
+    with open(results_file, 'wb') as f:
         pickle.dump(results, f)
 
-    print("Results saved to 'lda_results.pkl'")
+    print(f"Results saved to '{results_file}'")
 
     # Show summary
     print("\n" + "=" * 60)
@@ -111,4 +466,12 @@ def run_lda_analysis():
 
 
 if __name__ == '__main__':
-    run_lda_analysis()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the LDA model on the preprocessed articles.")
+    parser.add_argument("--checkpoint-dir", help="Save a checkpoint every 5 passes here and resume from the latest")
+    parser.add_argument("--convergence", choices=list(CONVERGENCE_TOLERANCE),
+                        help="Stop before 50 passes once this signal converges (default: all 50 passes)")
+    args = parser.parse_args()
+
+    run_lda_analysis(checkpoint_dir=args.checkpoint_dir, convergence=args.convergence)
\ No newline at end of file
@@ -0,0 +1,189 @@
+import json
+import os
+import pickle
+
+from instrumentation import track, tracked
+from lda_analysis import build_corpus, compute_coherence, document_topics, load_documents, train_lda_model
+
+# Multi-seed LDA ensemble: train the same model with N random seeds in parallel,
+# align the topics of every run to a reference run (optimal one-to-one matching)
+# and report how stable each topic is across seeds.
+
+# Worker-process globals, set once per process by _init_worker
+_corpus = None
+_id2word = None
+
+
+def _init_worker(corpus, id2word):
+    global _corpus, _id2word
+    _corpus = corpus
+    _id2word = id2word
+
+
+def _train_seed(seed, num_topics, passes):
+    # Train one ensemble member and return only what alignment needs
+    import numpy as np
+
+    with track("ensemble.train", seed):
+        lda_model = train_lda_model(_corpus, _id2word, num_topics, passes, random_state=seed)
+    return {
+        "seed": seed,
+        "topics": lda_model.get_topics(),          # K x V topic-term probabilities
+        "lambda": lda_model.state.get_lambda(),    # K x V variational parameters
+        "alpha": np.asarray(lda_model.alpha),
+        "eta": np.asarray(lda_model.eta),
+    }
+
+
+def topic_similarity(reference, other, metric="cosine", topn=20):
+    """K x K similarity between the topics of two runs (rows: reference topics)"""
+    import numpy as np
+
+    if metric == "cosine":
+        a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        b = other / np.linalg.norm(other, axis=1, keepdims=True)
+        return a @ b.T
+
+    if metric == "jaccard":
+        top_a = [set(row) for row in np.argsort(-reference, axis=1)[:, :topn]]
+        top_b = [set(row) for row in np.argsort(-other, axis=1)[:, :topn]]
+        return np.array([[len(x & y) / len(x | y) for y in top_b] for x in top_a])
+
+    raise ValueError(f"Unknown similarity metric: {metric}")
+
+
+def align_topics(reference, other, metric="cosine", topn=20):
+    """
+    Optimal one-to-one matching of the topics of 'other' to 'reference'.
+    Returns (permutation, similarities): other[permutation[k]] matches reference[k].
+    """
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+
+    similarity = topic_similarity(reference, other, metric, topn)
+    rows, cols = linear_sum_assignment(-similarity)
+    permutation = cols[np.argsort(rows)]
+    return permutation, similarity[np.arange(len(permutation)), permutation]
+
+
+def build_consensus_model(runs, id2word, num_topics):
+    """LdaModel whose topics are the average of the aligned runs"""
+    import numpy as np
+    from gensim.models.ldamodel import LdaModel
+
+    reference = runs[0]
+    consensus = LdaModel(id2word=id2word, num_topics=num_topics, alpha=reference["alpha"],
+                         eta=reference["eta"], random_state=reference["seed"])
+    mean_lambda = np.mean([run["lambda"][run["permutation"]] for run in runs], axis=0)
+    consensus.alpha = np.mean([run["alpha"][run["permutation"]] for run in runs], axis=0)
+    consensus.state.sstats = mean_lambda - consensus.eta
+    consensus.sync_state()
+    return consensus
+
+
+@tracked("ensemble")
+def run_lda_ensemble(preprocessed_folder="preprocessed_articles", num_seeds=8, num_topics=6, passes=50,
+                     base_seed=100, workers=None, metric="cosine", topn=20,
+                     output_file="lda_ensemble.json", consensus_file=None):
+    """
+    Train num_seeds LDA models in parallel processes and score topic stability.
+    Optionally save a consensus model in the lda_results.pkl format used by visualization.
+    """
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    print("Loading preprocessed documents...")
+    documents, file_names = load_documents(preprocessed_folder)
+    id2word, corpus = build_corpus(documents)
+    print(f"Loaded {len(documents)} documents, {len(id2word)} unique words")
+
+    seeds = [base_seed + i for i in range(num_seeds)]
+    workers = workers or min(num_seeds, os.cpu_count() or 1)
+    print(f"Training {num_seeds} LDA models ({num_topics} topics, {passes} passes) on {workers} processes...")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(corpus, id2word)) as pool:
+        runs = list(pool.map(_train_seed, seeds, [num_topics] * num_seeds, [passes] * num_seeds))
+
+    # Align every run to the first seed (the single-model default, random_state=100)
+    reference = runs[0]["topics"]
+    similarities = []
+    for run in runs:
+        run["permutation"], run_similarity = align_topics(reference, run["topics"], metric, topn)
+        similarities.append(run_similarity)
+    # The reference matches itself perfectly, so it is left out of the scores
+    similarities = np.array(similarities[1:]) if num_seeds > 1 else np.ones((1, num_topics))
+
+    topics = []
+    for topic_idx in range(num_topics):
+        top_word_ids = np.argsort(-reference[topic_idx])[:topn]
+        topics.append({
+            "topic": topic_idx,
+            "stability": float(similarities[:, topic_idx].mean()),
+            "min_similarity": float(similarities[:, topic_idx].min()),
+            "top_words": [id2word[int(word_id)] for word_id in top_word_ids],
+            "matched_topics": {str(run["seed"]): int(run["permutation"][topic_idx]) for run in runs},
+        })
+
+    report = {
+        "seeds": seeds,
+        "num_topics": num_topics,
+        "passes": passes,
+        "metric": metric,
+        "mean_stability": float(similarities.mean()),
+        "topics": topics,
+    }
+
+    print("\n" + "=" * 60)
+    print(f"TOPIC STABILITY ({metric} similarity over {num_seeds} seeds)")
+    print("=" * 60)
+    for topic in sorted(topics, key=lambda t: -t["stability"]):
+        print(f"Topic #{topic['topic']}: {topic['stability']:.3f} (min {topic['min_similarity']:.3f}) "
+              f"- {', '.join(topic['top_words'][:8])}")
+
+    if consensus_file:
+        print("Building consensus model...")
+        lda_model = build_consensus_model(runs, id2word, num_topics)
+        coherence_score = compute_coherence(lda_model, documents, id2word)
+        topic_matrix, topic_distribution = document_topics(lda_model, corpus, file_names)
+        results = {
+            'lda_model': lda_model,
+            'id2word': id2word,
+            'corpus': corpus,
+            'documents': documents,
+            'file_names': file_names,
+            'topic_matrix': topic_matrix,
+            'topic_distribution': topic_distribution,
+            'coherence_score': coherence_score,
+            'num_topics': num_topics
+        }
+        with open(consensus_file, 'wb') as f:
+            pickle.dump(results, f)
+        report["consensus_coherence"] = coherence_score
+        print(f"Consensus coherence: {coherence_score:.4f}, saved to '{consensus_file}'")
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Stability report saved to '{output_file}'")
+
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-seed LDA ensemble with topic stability scores.")
+    parser.add_argument("--folder", default="preprocessed_articles", help="Folder with preprocessed .txt files")
+    parser.add_argument("--seeds", type=int, default=8, help="Number of models / random seeds")
+    parser.add_argument("--base-seed", type=int, default=100)
+    parser.add_argument("--topics", type=int, default=6)
+    parser.add_argument("--passes", type=int, default=50)
+    parser.add_argument("--workers", type=int, help="Training processes (default: one per seed, up to CPU count)")
+    parser.add_argument("--metric", choices=["cosine", "jaccard"], default="cosine",
+                        help="Topic-term cosine or top-word Jaccard similarity")
+    parser.add_argument("--topn", type=int, default=20, help="Top words used for Jaccard and the report")
+    parser.add_argument("--output", default="lda_ensemble.json")
+    parser.add_argument("--consensus", help="Save a consensus model here (same format as lda_results.pkl)")
+    args = parser.parse_args()
+
+    run_lda_ensemble(args.folder, args.seeds, args.topics, args.passes, args.base_seed, args.workers,
+                     args.metric, args.topn, args.output, args.consensus)
@@ -1,16 +1,34 @@
-import fitz
+from functools import lru_cache
 from pathlib import Path
+import queue
+import tarfile
+import threading
 import time
+import zipfile
 
+from instrumentation import track, tracked, file_size
 
-def extract_pdf_text(pdf_file, output_folder):
+# Source PDFs can also come from zip / tar archives: every member is read into
+# memory and opened from there, the archive is never unpacked to disk.
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Source of one archive member, as used by the pipeline: "archive.zip::folder/report.pdf"
+MEMBER_SEPARATOR = "::"
+
+
+def extract_pdf_text(pdf_file, output_folder, data=None):
     # Extract text from one PDF and save it as a .txt file
+    # data: the PDF bytes when it is already in memory (archive member), pdf_file then only names it
     # Returns number of pages processed (0 if fails)
+    import fitz
+
+    pdf_file = Path(pdf_file)
     output_path = Path(output_folder)
     output_file = output_path / f"{pdf_file.stem}.txt"
+    bytes_in = len(data) if data is not None else file_size(pdf_file)
 
     try:
-        with fitz.open(pdf_file) as doc:
+        with track("extract", pdf_file.name, bytes_in=bytes_in) as metrics, \
+                (fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(pdf_file)) as doc:
             total_pages = len(doc)
 
             with open(output_file, 'w', encoding='utf-8') as f:
@@ -22,6 +40,7 @@ def extract_pdf_text(pdf_file, output_folder):
                     f.write(f"--- Page {page_num + 1} ---\n")
                     f.write(text + "\n\n")
 
+            metrics.update(items=total_pages, bytes_out=file_size(output_file))
             return total_pages
 
     except Exception as e:
@@ -29,33 +48,188 @@ def extract_pdf_text(pdf_file, output_folder):
         return 0
 
 
-def process_pdf_folder(input_folder, output_folder):
+# === ARCHIVES ===
+
+def is_archive(path):
+    path = Path(path)
+    return path.is_file() and path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_pdf_member(name):
+    # Skips the "._name.pdf" metadata files macOS adds to archives
+    return name.lower().endswith(".pdf") and not Path(name).name.startswith("._")
+
+
+def archive_pdf_names(archive_path):
+    # PDF member names of a zip or uncompressed tar archive, in archive order
+    # None for a compressed tar: its members are only known while streaming it
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            return [info.filename for info in archive.infolist() if not info.is_dir() and _is_pdf_member(info.filename)]
+    try:
+        with tarfile.open(archive_path, mode="r:") as archive:
+            return [member.name for member in archive if member.isfile() and _is_pdf_member(member.name)]
+    except tarfile.ReadError:
+        return None
+
+
+def _read_archive(archive_path):
+    # Yield (member name, bytes) of every PDF, reading the archive sequentially
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_pdf_member(info.filename):
+                    yield info.filename, archive.read(info)
+    else:
+        # Stream mode: a compressed tar is decompressed once, front to back
+        with tarfile.open(archive_path, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_pdf_member(member.name):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def iter_archive_pdfs(archive_path, read_ahead=4):
+    """
+    Yield (member name, PDF bytes) for every PDF of a zip or tar archive.
+    A reader thread decompresses the next members while the current one is
+    extracted, staying at most read_ahead PDFs ahead (bounded memory).
+    """
+    buffer = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # Gives up when the consumer stopped early
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for item in _read_archive(archive_path):
+                if not put(item):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            name, data = buffer.get()
+            if name is end:
+                if data is not None:
+                    raise data
+                return
+            yield name, data
+    finally:
+        stop.set()
+        thread.join()
+
+
+@lru_cache(maxsize=4)
+def _open_archive(archive_path):
+    # Archives stay open in the process that reads members from them one by one
+    if zipfile.is_zipfile(archive_path):
+        return zipfile.ZipFile(archive_path), None, threading.Lock()
+    try:
+        archive = tarfile.open(archive_path, mode="r:")
+    except tarfile.ReadError:
+        raise ValueError(f"{archive_path}: compressed tar archives can only be streamed in order, "
+                         f"extract them with process_pdf_folder or repack them as zip / plain tar")
+    return archive, {member.name: member for member in archive.getmembers()}, threading.Lock()
+
+
+def _duplicate_stem(name, seen):
+    # Members of different archive folders with the same file name would write the
+    # same .txt: the first one is kept, the others are skipped with a warning
+    stem = Path(name).stem
+    if stem in seen:
+        print(f"    WARNING: {name} has the same name as {seen[stem]}, skipped")
+        return True
+    seen[stem] = name
+    return False
+
+
+def pdf_sources(input_folder):
+    """
+    {document name: source} of the PDFs in a folder, or in a zip / uncompressed tar
+    archive (source "archive::member", random access to single members).
+    """
+    input_path = Path(input_folder)
+    if not is_archive(input_path):
+        return {pdf_file.stem: pdf_file for pdf_file in sorted(input_path.glob("*.pdf"))}
+
+    names = archive_pdf_names(input_path)
+    if names is None:
+        _open_archive(str(input_path.resolve()))  # raises the compressed tar error
+    seen = {}
+    return {Path(name).stem: f"{input_path.resolve()}{MEMBER_SEPARATOR}{name}"
+            for name in names if not _duplicate_stem(name, seen)}
+
+
+def extract_pdf_source(source, output_folder):
+    # extract_pdf_text for a pdf_sources() source: a PDF file or an archive member
+    source = str(source)
+    if MEMBER_SEPARATOR not in source:
+        return extract_pdf_text(Path(source), output_folder)
+
+    archive_path, member = source.split(MEMBER_SEPARATOR, 1)
+    archive, members, lock = _open_archive(archive_path)
+    with lock:
+        data = archive.read(member) if members is None else archive.extractfile(members[member]).read()
+    return extract_pdf_text(Path(member), output_folder, data)
+
+
+@tracked("extract")
+def process_pdf_folder(input_folder, output_folder, read_ahead=4):
     # Process all PDFs from input folder and save extracted text in output folder
+    # input_folder can also be a zip / tar archive: its PDFs are streamed from it, not unpacked
     # Recomandation: good to double-check (human verify) output files, some PDFs / pages may fail extraction
     input_path = Path(input_folder)
     output_path = Path(output_folder)
     output_path.mkdir(exist_ok=True)
 
-    # Collect all PDF files
-    pdf_files = list(input_path.glob("*.pdf"))
-    total_files = len(pdf_files)
+    # Collect all PDF files (total unknown for a compressed tar until it has been streamed)
+    if is_archive(input_path):
+        names = archive_pdf_names(input_path)
+        total_files = len({Path(name).stem for name in names}) if names is not None else None
+        seen = {}
+        pdf_items = ((name, data) for name, data in iter_archive_pdfs(input_path, read_ahead)
+                     if not _duplicate_stem(name, seen))
+    else:
+        pdf_files = list(input_path.glob("*.pdf"))
+        total_files = len(pdf_files)
+        pdf_items = ((pdf_file, None) for pdf_file in pdf_files)
 
     if total_files == 0:
         print("No PDF files found in the input folder.")
         return
 
-    print(f"Found {total_files} PDF files to process...")
+    if total_files is None:
+        print(f"Streaming PDF files from {input_path.name}...")
+    else:
+        print(f"Found {total_files} PDF files to process...")
     print("-" * 50)
 
     success_count = 0
     total_pages_processed = 0
+    files_seen = 0
 
     # Iterate through each PDF file
-    for i, pdf_file in enumerate(pdf_files, 1):
+    for i, (pdf_file, data) in enumerate(pdf_items, 1):
         start_time = time.time()
+        pdf_file = Path(pdf_file)
+        files_seen = i
+        progress = f"{i}/{total_files}" if total_files is not None else str(i)
 
         # Extract text for current file
-        page_count = extract_pdf_text(pdf_file, output_folder)
+        page_count = extract_pdf_text(pdf_file, output_folder, data)
 
         if page_count > 0:
             success_count += 1
@@ -63,9 +237,15 @@ def process_pdf_folder(input_folder, output_folder):
             processing_time = time.time() - start_time
 
             # Show success message with details
-            print(f"[{i}/{total_files}] Processed: {pdf_file.name} ({page_count} pages, {processing_time:.1f}s)")
+            print(f"[{progress}] Processed: {pdf_file.name} ({page_count} pages, {processing_time:.1f}s)")
         else:
-            print(f"[{i}/{total_files}] Failed: {pdf_file.name}")
+            print(f"[{progress}] Failed: {pdf_file.name}")
+
+    if total_files is None:
+        total_files = files_seen
+        if total_files == 0:
+            print("No PDF files found in the archive.")
+            return
 
     # Print summary at the end
     print("=" * 50)
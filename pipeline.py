@@ -0,0 +1,513 @@
+import hashlib
+import json
+import os
+import time
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+from instrumentation import configure, emit
+
+# === STAGE GRAPH ===
+# Every stage writes into its own folder inside the work directory.
+# 'document' stages run once per document, 'corpus' stages once per run
+# after all their upstream document units have finished. A corpus stage can
+# return "excluded" documents (not processed by its document successors) and
+# a content hash per output document ("hashes"): the successors of documents whose
+# hash differs from the last journaled run run again even if they are in the journal.
+STAGES = {
+    "extract": {"scope": "document", "deps": [], "output": "articles",
+                "workers": 2, "executor": "process"},
+    "clean": {"scope": "document", "deps": ["extract"], "output": "articles",
+              "workers": 2, "executor": "thread"},
+    "dedup": {"scope": "corpus", "deps": ["clean"], "output": "deduplicated_articles",
+              "workers": 1, "executor": "process"},
+    "translate": {"scope": "document", "deps": ["dedup"], "output": "translated_articles",
+                  "workers": 4, "executor": "thread"},
+    "preprocess": {"scope": "document", "deps": ["translate"], "output": "preprocessed_articles",
+                   "workers": max(1, (os.cpu_count() or 2) // 2), "executor": "process"},
+    "filter": {"scope": "document", "deps": ["preprocess"], "output": "preprocessed_articles_filtered",
+               "workers": 2, "executor": "thread"},
+    "index": {"scope": "corpus", "deps": ["preprocess"], "output": "innovation_index",
+              "workers": 1, "executor": "process"},
+    "model": {"scope": "corpus", "deps": ["filter"], "output": "lda_results.pkl",
+              "workers": 1, "executor": "process"},
+    "visualize": {"scope": "corpus", "deps": ["model"], "output": "charts",
+                  "workers": 1, "executor": "process"},
+}
+
+STATE_FILE = "pipeline_state.jsonl"
+
+# Files a document stage writes for one document ("<doc>.offsets" comes from preprocess)
+OUTPUT_SUFFIXES = (".txt", ".offsets")
+
+
+# === STAGE UNITS ===
+# Module imports stay inside the units so that worker processes only load
+# the dependencies (spaCy, gensim, matplotlib...) of the stage they run.
+
+def run_extract(doc, source, output):
+    from pdfExtraction import extract_pdf_source
+    output.mkdir(parents=True, exist_ok=True)
+    page_count = extract_pdf_source(source, output)
+    if page_count == 0:
+        raise RuntimeError("no pages extracted")
+    return {"pages": page_count}
+
+
+def run_clean(doc, source, output):
+    from removePageMarkers import remove_page_headers_from_file
+    headers_removed = remove_page_headers_from_file(output / f"{doc}.txt")
+    return {"headers_removed": headers_removed}
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+def run_dedup(docs, source, output, mode="collapse"):
+    from dedup import deduplicate_corpus
+    report = deduplicate_corpus(str(source), str(output), mode)
+    excluded = [Path(f).stem for f in report["excluded"]]
+    # Compared with the journal, not with the files on disk: a run killed after rewriting
+    # a file but before its journal line still counts that file as changed
+    hashes = {doc: _file_hash(output / f"{doc}.txt") for doc in docs
+              if doc not in excluded and (output / f"{doc}.txt").exists()}
+    return {"documents": report["documents"], "duplicates": report["duplicate_documents"],
+            "chars_saved": report["chars_saved"], "tokens_saved": report["tokens_saved"],
+            "excluded": excluded, "hashes": hashes}
+
+
+def run_translate(doc, source, output):
+    from translateES import translate_file
+    output.mkdir(parents=True, exist_ok=True)
+    lang = translate_file(str(source / f"{doc}.txt"), str(output / f"{doc}.txt"))
+    if not lang:
+        raise RuntimeError("empty document")
+    return {"lang": lang}
+
+
+def run_preprocess(doc, source, output):
+    from preprocessingText import preprocess_file
+    output.mkdir(parents=True, exist_ok=True)
+    token_count = preprocess_file(source / f"{doc}.txt", output / f"{doc}.txt", save_offsets=True)
+    return {"tokens": token_count}
+
+
+def run_filter(doc, source, output):
+    from postprocessingText import filter_file
+    output.mkdir(parents=True, exist_ok=True)
+    original_words, words_removed = filter_file(source / f"{doc}.txt", output / f"{doc}.txt")
+    return {"words": original_words, "removed": words_removed}
+
+
+def run_index(docs, source, output):
+    from innovation_index import build_index
+    translated = output.parent / STAGES["translate"]["output"]
+    build_index(str(source), str(translated), str(output))
+    return {"documents": len(docs)}
+
+
+def run_model(docs, source, output, top_k=None, convergence=None):
+    from dedup import WEIGHTS_FILE
+    from lda_analysis import run_lda_analysis
+
+    # Written by the dedup stage in weight mode only
+    weights_file = output.parent / STAGES["dedup"]["output"] / WEIGHTS_FILE
+    # A model stage interrupted mid-training resumes from its last checkpoint
+    results = run_lda_analysis(str(source), str(output), str(weights_file) if weights_file.exists() else None,
+                               str(output.parent / "lda_checkpoints"), convergence=convergence, top_k=top_k)
+    return {"documents": len(results['file_names']), "coherence": float(results['coherence_score']),
+            "passes_used": results['training']['passes_used']}
+
+
+def run_visualize(docs, source, output):
+    import matplotlib
+    matplotlib.use('Agg')
+    from visualization import create_advanced_visualizations
+
+    output.mkdir(parents=True, exist_ok=True)
+    # The chart functions save into the current folder; this runs in its own worker process
+    previous_dir = os.getcwd()
+    os.chdir(output)
+    try:
+        create_advanced_visualizations(str(source), show=False)
+    finally:
+        os.chdir(previous_dir)
+    return {"charts": len(list(output.glob("*.png")))}
+
+
+UNITS = {
+    "extract": run_extract,
+    "clean": run_clean,
+    "dedup": run_dedup,
+    "translate": run_translate,
+    "preprocess": run_preprocess,
+    "filter": run_filter,
+    "index": run_index,
+    "model": run_model,
+    "visualize": run_visualize,
+}
+
+
+def _run_unit(stage, doc, source, output, options=None):
+    # Runs inside a worker: returns (result, seconds) or raises
+    start_time = time.time()
+    result = UNITS[stage](doc, source, output, **(options or {}))
+    return result, time.time() - start_time
+
+
+# === STATE JOURNAL ===
+# One JSON line per finished unit. The last line of a unit wins, so a failed
+# rerun clears an older "done". A done line also records the journal positions
+# of the outputs the unit read ("inputs") and its stage options: the unit is
+# only resumed while both match.
+
+def load_state(workdir):
+    """Read the journal of completed units: {(stage, doc): entry}, with each entry's byte position"""
+    completed = {}
+    state_path = Path(workdir) / STATE_FILE
+    if not state_path.exists():
+        return completed
+
+    position = 0
+    with open(state_path, 'rb') as f:
+        for line in f:
+            entry_position, position = position, position + len(line)
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partially written last line
+                continue
+            key = (entry["stage"], entry["doc"])
+            if entry.get("status") == "done":
+                entry["position"] = entry_position
+                completed[key] = entry
+            else:
+                completed.pop(key, None)
+    return completed
+
+
+def open_journal(workdir):
+    """Open the journal for appending, after any line a crash left unfinished"""
+    state_path = Path(workdir) / STATE_FILE
+    state_file = open(state_path, 'a', encoding='utf-8')
+    if state_file.tell() > 0:
+        with open(state_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                state_file.write("\n")
+                state_file.flush()
+    return state_file
+
+
+def _journal(state_file, stage, doc, status, result=None, **fields):
+    # Returns the position of the new line, the version of the unit's output
+    position = state_file.tell()
+    state_file.write(json.dumps({"stage": stage, "doc": doc, "status": status, "result": result, **fields}) + "\n")
+    state_file.flush()
+    os.fsync(state_file.fileno())
+    return position
+
+
+def _version(entry, doc=None):
+    # Journal position of the output a unit reads from a done unit. A corpus stage that
+    # reports output hashes keeps, for unchanged documents, the position of their last change.
+    return entry.get("versions", {}).get(doc, entry["position"])
+
+
+def unit_inputs(name, doc, journal, docs):
+    """
+    Versions of everything a unit reads, from the done entries in journal:
+    {dep: position} for a document unit, {dep: {doc: position}} for a corpus unit
+    reading a document stage (only the documents that stage completed).
+    """
+    inputs = {}
+    for dep in STAGES[name]["deps"]:
+        if STAGES[dep]["scope"] == "corpus":
+            inputs[dep] = _version(journal[(dep, None)], doc)
+        elif doc is None:
+            inputs[dep] = {d: _version(journal[(dep, d)]) for d in sorted(docs) if (dep, d) in journal}
+        else:
+            inputs[dep] = _version(journal[(dep, doc)])
+    return inputs
+
+
+# === RUNNER ===
+
+def stage_folders(name, input_folder, workdir):
+    """Return (source, output) paths of a stage: it reads the output of its first dependency"""
+    spec = STAGES[name]
+    deps = spec["deps"]
+    source = Path(input_folder) if not deps else Path(workdir) / STAGES[deps[0]]["output"]
+    return source, Path(workdir) / spec["output"]
+
+
+def remove_stale_outputs(workdir, docs):
+    """
+    Delete the per-document outputs of documents that are no longer in the input,
+    since the corpus stages read whole folders. Returns the number of files removed.
+    """
+    folders = set()
+    for spec in STAGES.values():
+        if spec["scope"] == "document":
+            folders.add(spec["output"])
+            folders.update(STAGES[dep]["output"] for dep in spec["deps"])
+
+    removed = 0
+    for folder in sorted(folders):
+        for suffix in OUTPUT_SUFFIXES:
+            for path in (Path(workdir) / folder).glob(f"*{suffix}"):
+                if path.name[:-len(suffix)] not in docs:
+                    path.unlink()
+                    removed += 1
+    return removed
+
+
+def select_stages(until=None):
+    """Return the stages to run, in topological order, stopping after 'until'"""
+    order = list(TopologicalSorter({name: spec["deps"] for name, spec in STAGES.items()}).static_order())
+    if until is None:
+        return order
+
+    if until not in STAGES:
+        raise ValueError(f"Unknown stage: {until}")
+    needed = {until}
+    for name in reversed(order):
+        if name in needed:
+            needed.update(STAGES[name]["deps"])
+    return [name for name in order if name in needed]
+
+
+def run_pipeline(input_folder, workdir="pipeline_run", until=None, workers=None, restart=False, options=None):
+    """
+    Run the stage graph over every PDF in input_folder (a folder or a zip / tar archive).
+    Each document moves to the next stage as soon as its previous stage is done,
+    so documents are pipelined across stages instead of waiting for the whole corpus.
+    options gives extra keyword arguments per stage unit, e.g. {"dedup": {"mode": "drop"}}.
+    """
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+    from pdfExtraction import pdf_sources
+
+    # Absolute paths, since the visualize stage changes its working folder
+    input_path = Path(input_folder).resolve()
+    workdir = Path(workdir).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    stages = select_stages(until)
+    workers = workers or {}
+    # Unset options (None) are left to the unit's defaults
+    options = {name: {key: value for key, value in (options or {}).get(name, {}).items() if value is not None}
+               for name in stages}
+    successors = {name: [s for s in stages if name in STAGES[s]["deps"]] for name in stages}
+
+    # A folder of PDFs, or a zip / tar archive whose members are read without unpacking it
+    docs = pdf_sources(input_path)
+    if not docs:
+        print("No PDF files found in the input folder.")
+        return {}
+
+    if restart and (workdir / STATE_FILE).exists():
+        (workdir / STATE_FILE).unlink()
+    completed = load_state(workdir)
+
+    print(f"Found {len(docs)} documents, stages: {' -> '.join(stages)}")
+    removed = remove_stale_outputs(workdir, docs)
+    if removed:
+        print(f"Removed {removed} output files of documents no longer in the input")
+    print("-" * 50)
+
+    # Process workers start on their first unit, while the thread pools are busy: forking
+    # then could copy a lock held by another thread (stdout, metrics), so they are spawned
+    spawn = multiprocessing.get_context("spawn")
+    executors = {}
+    for name in stages:
+        max_workers = workers.get(name, STAGES[name]["workers"])
+        if STAGES[name]["executor"] == "process":
+            executors[name] = ProcessPoolExecutor(max_workers=max_workers, mp_context=spawn)
+        else:
+            executors[name] = ThreadPoolExecutor(max_workers=max_workers)
+
+    status = {}                                # (stage, doc) -> done / failed / blocked / excluded
+    finished = {name: 0 for name in stages}    # terminal document units per stage
+    current = {}                               # (stage, doc) -> journal entry of the units done in this run
+    corpus_results = {}                        # corpus stage -> its result (this run or the journal)
+    running = {}                               # future -> (stage, doc)
+    submitted = {}                             # (stage, doc) -> inputs of a running unit
+    summary = {name: {"done": 0, "skipped": 0, "failed": 0, "excluded": 0} for name in stages}
+
+    def deps_ready(name, doc):
+        for dep in STAGES[name]["deps"]:
+            key = (dep, doc) if STAGES[dep]["scope"] == "document" else (dep, None)
+            if status.get(key) != "done":
+                return False
+        return True
+
+    def corpus_ready(name):
+        for dep in STAGES[name]["deps"]:
+            if STAGES[dep]["scope"] == "document":
+                if finished[dep] < len(docs):
+                    return False
+                if not any(status.get((dep, doc)) == "done" for doc in docs):
+                    return False
+            elif status.get((dep, None)) != "done":
+                return False
+        return True
+
+    def excluded(name, doc):
+        return any(doc in corpus_results.get(dep, {}).get("excluded", []) for dep in STAGES[name]["deps"])
+
+    def remove_outputs(name, doc):
+        # The corpus stages read whole folders: an excluded document must not leave files from earlier runs
+        output = stage_folders(name, input_path, workdir)[1]
+        for suffix in OUTPUT_SUFFIXES:
+            (output / f"{doc}{suffix}").unlink(missing_ok=True)
+        if (name, doc) in completed:
+            _journal(state_file, name, doc, "excluded")
+
+    def finish(name, doc, outcome, result=None):
+        status[(name, doc)] = outcome
+        if doc is not None:
+            finished[name] += 1
+        else:
+            corpus_results[name] = result or {}
+        if outcome == "excluded":
+            summary[name]["excluded"] += 1
+            remove_outputs(name, doc)
+        for succ in successors[name]:
+            if STAGES[succ]["scope"] == "corpus":
+                schedule(succ, None)
+            else:
+                for other in ([doc] if doc is not None else docs):
+                    if outcome == "done":
+                        schedule(succ, other)
+                    elif (succ, other) not in status:
+                        finish(succ, other, "excluded" if outcome == "excluded" else "blocked")
+
+    def schedule(name, doc):
+        if (name, doc) in status or (name, doc) in submitted:
+            return
+        if doc is None:
+            if not corpus_ready(name):
+                return
+        else:
+            if not deps_ready(name, doc):
+                return
+            if excluded(name, doc):
+                finish(name, doc, "excluded")
+                return
+
+        # A journaled result is only reused if it was computed from the current inputs and options
+        inputs = unit_inputs(name, doc, current, docs)
+        entry = completed.get((name, doc))
+        if entry is not None and entry.get("inputs") == inputs and entry.get("options", {}) == options[name]:
+            summary[name]["skipped"] += 1
+            current[(name, doc)] = entry
+            finish(name, doc, "done", entry.get("result"))
+            return
+
+        source, output = stage_folders(name, input_path, workdir)
+        if name == "extract":
+            source = docs[doc]
+        future = executors[name].submit(_run_unit, name, doc if doc is not None else sorted(docs), source, output,
+                                        options[name])
+        running[future] = (name, doc)
+        submitted[(name, doc)] = inputs
+
+    with open_journal(workdir) as state_file:
+        try:
+            roots = [name for name in stages if not STAGES[name]["deps"]]
+            for doc in docs:
+                for name in roots:
+                    schedule(name, doc)
+
+            while running:
+                done_futures, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done_futures:
+                    name, doc = running.pop(future)
+                    inputs = submitted.pop((name, doc))
+                    label = doc if doc is not None else "corpus"
+                    try:
+                        result, seconds = future.result()
+                    except Exception as e:
+                        print(f"[{name}] Failed: {label} ({e})")
+                        emit("pipeline_unit", stage=name, item=label, status="error", error=str(e))
+                        summary[name]["failed"] += 1
+                        _journal(state_file, name, doc, "failed", {"error": str(e)})
+                        finish(name, doc, "failed")
+                        continue
+
+                    print(f"[{name}] Done: {label} ({seconds:.1f}s)")
+                    emit("pipeline_unit", stage=name, item=label, status="ok", wall_s=round(seconds, 6))
+                    summary[name]["done"] += 1
+                    fields = {"inputs": inputs, "options": options[name]}
+                    previous = completed.get((name, doc))
+                    if doc is None and "hashes" in (result or {}):
+                        previous_hashes = (previous or {}).get("result", {}).get("hashes", {})
+                        unchanged = sorted(d for d, digest in result["hashes"].items()
+                                           if previous_hashes.get(d) == digest)
+                        result["changed"] = sorted(set(result["hashes"]) - set(unchanged))
+                        fields["versions"] = {d: _version(previous, d) for d in unchanged}
+                    position = _journal(state_file, name, doc, "done", result, **fields)
+                    current[(name, doc)] = {"result": result, "position": position, **fields}
+                    finish(name, doc, "done", result)
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    # Print summary at the end
+    print("=" * 50)
+    print("PIPELINE SUMMARY")
+    print("=" * 50)
+    for name in stages:
+        counts = summary[name]
+        print(f"{name:<12} done: {counts['done']:<6} resumed: {counts['skipped']:<6} failed: {counts['failed']:<6} "
+              f"excluded: {counts['excluded']}")
+        emit("pipeline_stage", stage=name, **counts)
+
+    return summary
+
+
+def _parse_workers(values):
+    workers = {}
+    for value in values or []:
+        name, _, count = value.partition("=")
+        if name not in STAGES or not count.isdigit():
+            raise ValueError(f"Invalid --workers value: {value} (expected stage=N)")
+        workers[name] = int(count)
+    return workers
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dedup import MODES as DEDUP_MODES
+
+    parser = argparse.ArgumentParser(description="Run the innovation corpus pipeline stage graph.")
+    parser.add_argument("input_folder", help="Folder (or zip / tar archive) with the source PDF files")
+    parser.add_argument("--workdir", default="pipeline_run", help="Folder for all stage outputs and the state journal")
+    parser.add_argument("--until", choices=list(STAGES), help="Last stage to run")
+    parser.add_argument("--workers", nargs="*", metavar="STAGE=N", help="Worker pool size per stage")
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal and run every unit again")
+    parser.add_argument("--dedup-mode", choices=DEDUP_MODES, default="collapse",
+                        help="How near-duplicate documents and boilerplate passages are handled before translation")
+    parser.add_argument("--topic-top-k", type=int,
+                        help="Store only the top K topics per document (sparse document-topic matrix)")
+    parser.add_argument("--convergence", choices=["topics", "perplexity"],
+                        help="Stop LDA training early once this signal converges (default: all 50 passes)")
+    parser.add_argument("--metrics", help="Write JSON-lines metrics events to this file")
+    parser.add_argument("--profile", help="Comma-separated stages to run under cProfile/tracemalloc (or 'all')")
+    parser.add_argument("--profile-dir", help="Folder for the .prof files (default: profiles)")
+    args = parser.parse_args()
+
+    try:
+        workers = _parse_workers(args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    configure(args.metrics, args.profile, args.profile_dir)
+
+    run_pipeline(args.input_folder, args.workdir, args.until, workers, args.restart,
+                 {"dedup": {"mode": args.dedup_mode},
+                  "model": {"top_k": args.topic_top_k, "convergence": args.convergence}})
@@ -1,48 +1,83 @@
 import os
 from collections import Counter
 
+from instrumentation import track, tracked
 
-def filter_preprocessed_files():
+
+# LISTĂ OPTIMIZATĂ - elimină doar cuvintele care chiar distorsionează
+WORDS_TO_REMOVE = {
+    # === NUME PROPII care domină artificial ===
+    "aena", "repsol", "indra", "puig", "merlin", "colonial", "acs",
+    "santander", "bankinter", "inditex", "arcelormittal", "redeia",
+    "accionar", "acciona", "hispasat", "enir", "cnmc", "asg",
+
+    # === TERMENI FINANCIARI GENERICI ===
+    "eur", "einf", "ifrs", "isr", "pcaf", "financiero",
+    "reaseguro", "asegurador", "actuarial", "prudencial",
+    "dudoso", "enajenabl", "subordinado", "reclasificación", "traspaso",
+
+    # === CUVINTE TEHNICE/ADMINISTRATIVE GENERICE ===
+    "páginar", "subapartado", "indique", "explique", "incorrección",
+    "subsidiario", "planto", "downstream", "sucursal", "concesionario",
+    "concesional",
+
+    # === ABREVIERI ȘI ACRONIME ===
+    "nfrd", "gar", "icr", "dinf", "pds", "pcaf",
+
+    # === CUVINTE GENERICE FĂRĂ SEMNIFICAȚIE ===
+    "ave", "properti", "preocupante", "portafolio", "products", "other",
+    "fila", "arabio", "saf", "crudo",
+
+    # === ALTE CUVINTE PROBLEMATICE ===
+    "carto", "creador", "relacional", "facilitador", "controlador",
+    "memoriar", "memorio", "págín", "vii", "anexos", "vistazo",
+    "monto", "gerencia", "var"
+
+    "abreviatura", "insignificante", "oneroso", "ción",
+    "emear", "gente", "padre", "coruña",
+    "panamá", "dominicano", "peruano", "perú"
+}
+
+
+def filter_file(input_path, output_path, words_to_remove=WORDS_TO_REMOVE):
     """
-    Post-procesare: elimină DOAR cuvintele cu adevărat problematice
+    Filtrează un singur fișier preprocesat.
+    Returnează (cuvinte originale, cuvinte eliminate)
     """
-    # LISTĂ OPTIMIZATĂ - elimină doar cuvintele care chiar distorsionează
-    words_to_remove = {
-        # === NUME PROPII care domină artificial ===
-        "aena", "repsol", "indra", "puig", "merlin", "colonial", "acs",
-        "santander", "bankinter", "inditex", "arcelormittal", "redeia",
-        "accionar", "acciona", "hispasat", "enir", "cnmc", "asg",
-
-        # === TERMENI FINANCIARI GENERICI ===
-        "eur", "einf", "ifrs", "isr", "pcaf", "financiero",
-        "reaseguro", "asegurador", "actuarial", "prudencial",
-        "dudoso", "enajenabl", "subordinado", "reclasificación", "traspaso",
-
-        # === CUVINTE TEHNICE/ADMINISTRATIVE GENERICE ===
-        "páginar", "subapartado", "indique", "explique", "incorrección",
-        "subsidiario", "planto", "downstream", "sucursal", "concesionario",
-        "concesional",
-
-        # === ABREVIERI ȘI ACRONIME ===
-        "nfrd", "gar", "icr", "dinf", "pds", "pcaf",
-
-        # === CUVINTE GENERICE FĂRĂ SEMNIFICAȚIE ===
-        "ave", "properti", "preocupante", "portafolio", "products", "other",
-        "fila", "arabio", "saf", "crudo",
-
-        # === ALTE CUVINTE PROBLEMATICE ===
-        "carto", "creador", "relacional", "facilitador", "controlador",
-        "memoriar", "memorio", "págín", "vii", "anexos", "vistazo",
-        "monto", "gerencia", "var"
-
-        "abreviatura", "insignificante", "oneroso", "ción",
-        "emear", "gente", "padre", "coruña",
-        "panamá", "dominicano", "peruano", "perú"
-    }
-
-    input_folder = "preprocessed_articles"
-    output_folder = "preprocessed_articles_filtered"
+    with track("filter", os.path.basename(input_path)) as metrics:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Numără cuvintele originale
+        words = content.split()
+
+        # Elimină cuvintele nedorite și numără câte au fost eliminate
+        filtered_words = []
+        words_removed_from_file = 0
+
+        for word in words:
+            if word in words_to_remove:
+                words_removed_from_file += 1
+            else:
+                filtered_words.append(word)
 
+        filtered_content = " ".join(filtered_words)
+
+        # Salvează fișierul filtrat
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(filtered_content)
+
+        metrics.update(bytes_in=len(content), bytes_out=len(filtered_content),
+                       items=len(words), removed=words_removed_from_file)
+        return len(words), words_removed_from_file
+
+
+@tracked("filter")
+def filter_preprocessed_files(input_folder="preprocessed_articles",
+                              output_folder="preprocessed_articles_filtered"):
+    """
+    Post-procesare: elimină DOAR cuvintele cu adevărat problematice
+    """
     os.makedirs(output_folder, exist_ok=True)
 
     print("🗑️  Removing problematic words from preprocessed files...")
@@ -55,29 +90,9 @@ def filter_preprocessed_files():
             input_path = os.path.join(input_folder, filename)
             output_path = os.path.join(output_folder, filename)
 
-            with open(input_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # Numără cuvintele originale
-            words = content.split()
-            total_original_words += len(words)
-
-            # Elimină cuvintele nedorite și numără câte au fost eliminate
-            filtered_words = []
-            words_removed_from_file = 0
-
-            for word in words:
-                if word in words_to_remove:
-                    words_removed_from_file += 1
-                else:
-                    filtered_words.append(word)
-
+            original_words, words_removed_from_file = filter_file(input_path, output_path)
+            total_original_words += original_words
             total_words_removed += words_removed_from_file
-            filtered_content = " ".join(filtered_words)
-
-            # Salvează fișierul filtrat
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(filtered_content)
 
             print(f"   {filename}: removed {words_removed_from_file} words")
 
@@ -1,7 +1,8 @@
-import spacy
 import re
 import os
-from spacy.lang.es.stop_words import STOP_WORDS as ES_STOP_WORDS
+from array import array
+
+from instrumentation import track, tracked
 
 # === CONFIGURATION ===
 INPUT_DIR = "translated_articles"
@@ -37,15 +38,39 @@ custom_stopwords = {
     "resultar", "reunir", "revisar", "solicitar", "subir", "sugerir", "superar", "temer", "terminar",
     "testar", "tocar", "transformar", "transmitir", "usar", "valer", "variar", "visualizar", "vivir"
 }
-ALL_STOPWORDS = ES_STOP_WORDS.union(custom_stopwords)
 
-# Load spaCy model
-print("Loading spaCy model...")
-nlp = spacy.load("es_core_news_sm", disable=['parser', 'ner'])
-print("Model loaded!")
+# spaCy and its model are loaded on first use and shared by all calls in the process
+_shared = {}
+
+
+def get_stopwords():
+    """spaCy Spanish stop words + custom stop words"""
+    if "stopwords" not in _shared:
+        from spacy.lang.es.stop_words import STOP_WORDS as ES_STOP_WORDS
+        _shared["stopwords"] = ES_STOP_WORDS.union(custom_stopwords)
+    return _shared["stopwords"]
+
+
+def get_nlp():
+    """The spaCy pipeline, loaded once per process"""
+    if "nlp" not in _shared:
+        import spacy
+        print("Loading spaCy model...")
+        _shared["nlp"] = spacy.load("es_core_news_sm", disable=['parser', 'ner'])
+        print("Model loaded!")
+    return _shared["nlp"]
+
 
+def __getattr__(name):
+    # Keep 'preprocessingText.nlp' and 'preprocessingText.ALL_STOPWORDS' working without loading them at import
+    if name == "nlp":
+        return get_nlp()
+    if name == "ALL_STOPWORDS":
+        return get_stopwords()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def process_large_text(text, chunk_size=1000000):
+
+def process_large_text(text, chunk_size=1000000, with_offsets=False):
     """
     Process very large texts by splitting them into smaller chunks.
     """
@@ -60,37 +85,131 @@ def process_large_text(text, chunk_size=1000000):
                 end = start + last_space
                 chunk = text[start:end]
 
-        processed_chunk = process_text_chunk(chunk)
+        processed_chunk = process_text_chunk(chunk, with_offsets)
+        if with_offsets:
+            processed_chunk = [(lemma, start + offset) for lemma, offset in processed_chunk]
         all_processed_tokens.extend(processed_chunk)
 
     return all_processed_tokens
 
 
-def process_text_chunk(text):
+DIGITS_RE = re.compile(r'\d+')
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+SPACES_RE = re.compile(r'\s+')
+
+
+def _sub_with_offsets(pattern, replacement, text, offsets):
+    # re.sub for a single-character (or empty) replacement that also keeps,
+    # for every output character, its offset in the original text
+    parts = []
+    new_offsets = array('q')
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(text[last:match.start()])
+        new_offsets.extend(offsets[last:match.start()])
+        if replacement:
+            parts.append(replacement)
+            new_offsets.append(offsets[match.start()])
+        last = match.end()
+    parts.append(text[last:])
+    new_offsets.extend(offsets[last:])
+    return "".join(parts), new_offsets
+
+
+def normalize_with_offsets(text):
+    """
+    Same normalization as process_text_chunk, plus the offset of each
+    normalized character in the original text.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        offsets = array('q', range(len(text)))
+    else:
+        # A few characters expand when lowercased (e.g. 'İ')
+        offsets = array('q')
+        for i, char in enumerate(text):
+            offsets.extend([i] * len(char.lower()))
+
+    text, offsets = _sub_with_offsets(DIGITS_RE, '', lowered, offsets)
+    text, offsets = _sub_with_offsets(PUNCTUATION_RE, ' ', text, offsets)
+    text, offsets = _sub_with_offsets(SPACES_RE, ' ', text, offsets)
+
+    stripped = text.strip()
+    start = len(text) - len(text.lstrip())
+    return stripped, offsets[start:start + len(stripped)]
+
+
+def process_text_chunk(text, with_offsets=False):
     """
     Process a text chunk with aggressive preprocessing.
+    With with_offsets, returns (lemma, offset in the input text) pairs.
     """
-    text = text.lower()
-    text = re.sub(r'\d+', '', text)
-    text = re.sub(r'[^\w\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
+    if with_offsets:
+        text, offsets = normalize_with_offsets(text)
+    else:
+        text = text.lower()
+        text = re.sub(r'\d+', '', text)
+        text = re.sub(r'[^\w\s]', ' ', text)
+        text = re.sub(r'\s+', ' ', text)
+        text = text.strip()
 
     if not text:
         return []
 
-    doc = nlp(text)
+    doc = get_nlp()(text)
+    stopwords = get_stopwords()
     processed_tokens = []
 
     for token in doc:
         if token.pos_ in {'NOUN', 'VERB', 'ADJ', 'ADV'}:
-            if token.lemma_ not in ALL_STOPWORDS:
+            if token.lemma_ not in stopwords:
                 if 2 < len(token.lemma_) < 25:
-                    processed_tokens.append(token.lemma_)
+                    if with_offsets:
+                        processed_tokens.append((token.lemma_, offsets[token.idx]))
+                    else:
+                        processed_tokens.append(token.lemma_)
 
     return processed_tokens
 
 
+def preprocess_file(input_path, output_path, save_offsets=False):
+    """
+    Preprocess one .txt file and save the space-separated tokens.
+    With save_offsets, the character offset of every token in the input
+    text is saved next to it in a .offsets file (used by innovation_index).
+    Returns the number of extracted tokens.
+    """
+    with track("preprocess", os.path.basename(input_path)) as metrics:
+        with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+
+        file_size = len(content)
+        print(f"    Size: {file_size} characters")
+
+        if file_size > 500000:
+            print(f"    Large file - processing in chunks...")
+            preprocessed_tokens = process_large_text(content, with_offsets=save_offsets)
+        else:
+            preprocessed_tokens = process_text_chunk(content, with_offsets=save_offsets)
+
+        print(f"    Extracted tokens: {len(preprocessed_tokens)}")
+
+        if save_offsets:
+            offsets = [str(offset) for _, offset in preprocessed_tokens]
+            preprocessed_tokens = [lemma for lemma, _ in preprocessed_tokens]
+            with open(os.path.splitext(output_path)[0] + '.offsets', 'w', encoding='utf-8') as f:
+                f.write(" ".join(offsets))
+
+        output_content = " ".join(preprocessed_tokens)
+
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output_content)
+
+        metrics.update(bytes_in=file_size, bytes_out=len(output_content), items=len(preprocessed_tokens))
+        return len(preprocessed_tokens)
+
+
+@tracked("preprocess")
 def process_all_files(input_dir, output_dir):
     """
     Process all .txt files from the input directory
@@ -109,35 +228,9 @@ def process_all_files(input_dir, output_dir):
         print(f"[{i}/{total_files}] Processing: {filename}")
 
         try:
-            with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-        except Exception as e:
-            print(f"    ERROR reading {filename}: {e}")
-            continue
-
-        file_size = len(content)
-        print(f"    Size: {file_size} characters")
-
-        try:
-            if file_size > 500000:
-                print(f"    Large file - processing in chunks...")
-                preprocessed_tokens = process_large_text(content)
-            else:
-                preprocessed_tokens = process_text_chunk(content)
-
-            print(f"    Extracted tokens: {len(preprocessed_tokens)}")
-
-        except Exception as e:
-            print(f"    ERROR preprocessing {filename}: {e}")
-            continue
-
-        output_content = " ".join(preprocessed_tokens)
-
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(output_content)
+            preprocess_file(input_path, output_path)
         except Exception as e:
-            print(f"    ERROR writing {filename}: {e}")
+            print(f"    ERROR processing {filename}: {e}")
             continue
 
     print("Preprocessing completed!")
@@ -1,7 +1,34 @@
 from pathlib import Path
 import re
 
+from instrumentation import track, tracked
 
+
+def remove_page_headers_from_file(text_file):
+    # Remove all "--- Page X ---" headers from one text file (in place)
+    # Returns number of headers removed
+    with track("clean", Path(text_file).name) as metrics:
+        with open(text_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        # Count headers before cleaning
+        headers_before = content.count('--- Page ')
+
+        # Remove all headers with regex
+        cleaned_content = re.sub(r'--- Page \d+ ---\n', '', content)
+
+        # Write cleaned text back to the same file
+        with open(text_file, 'w', encoding='utf-8') as f:
+            f.write(cleaned_content)
+
+        # Count how many headers were removed
+        headers_after = cleaned_content.count('--- Page ')
+        metrics.update(bytes_in=len(content), bytes_out=len(cleaned_content),
+                       items=headers_before - headers_after)
+        return headers_before - headers_after
+
+
+@tracked("clean")
 def remove_page_headers_from_folder(folder_path):
     # Remove all "--- Page X ---" headers from text files in a folder
     # Also print how many headers were removed for each file
@@ -21,22 +48,7 @@ def remove_page_headers_from_folder(folder_path):
     # Go through each .txt file
     for text_file in text_files:
         try:
-            with open(text_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # Count headers before cleaning
-            headers_before = content.count('--- Page ')
-
-            # Remove all headers with regex
-            cleaned_content = re.sub(r'--- Page \d+ ---\n', '', content)
-
-            # Write cleaned text back to the same file
-            with open(text_file, 'w', encoding='utf-8') as f:
-                f.write(cleaned_content)
-
-            # Count how many headers were removed
-            headers_after = cleaned_content.count('--- Page ')
-            headers_removed = headers_before - headers_after
+            headers_removed = remove_page_headers_from_file(text_file)
 
             total_headers_removed += headers_removed
             files_processed += 1
@@ -54,6 +66,7 @@ def remove_page_headers_from_folder(folder_path):
     print(f"Total headers removed: {total_headers_removed}")
 
 
-# Example usage
-folder_path = "../articles"  # Path to folder with text files
-remove_page_headers_from_folder(folder_path)
+if __name__ == "__main__":
+    # Example usage
+    folder_path = "../articles"  # Path to folder with text files
+    remove_page_headers_from_folder(folder_path)
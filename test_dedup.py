@@ -0,0 +1,99 @@
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from dedup import REPORT_FILE, WEIGHTS_FILE, deduplicate_corpus
+
+# A tiny corpus: three different reports that all end with the same legal
+# disclaimer, and "a_old.txt", last year's copy of "a.txt" without its last sentence.
+DISCLAIMER = ("This report contains forward looking statements that involve risks and uncertainties "
+              "beyond the control of the company.")
+
+
+def _report(seed, sentences=20):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(400)]
+    return [" ".join(rng.choice(words) for _ in range(12)) + "." for _ in range(sentences)]
+
+
+class DeduplicateCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.input = Path(tmp.name) / "articles"
+        self.output = Path(tmp.name) / "deduplicated_articles"
+        self.input.mkdir()
+
+        report_a = _report(1)
+        self.texts = {
+            "a.txt": "\n".join(report_a + [DISCLAIMER]) + "\n",
+            "a_old.txt": "\n".join(report_a[:-1] + [DISCLAIMER]) + "\n",
+            "b.txt": "\n".join(_report(2) + [DISCLAIMER]) + "\n",
+            "c.txt": "\n".join(_report(3) + [DISCLAIMER]) + "\n",
+        }
+        for filename, text in self.texts.items():
+            (self.input / filename).write_text(text, encoding='utf-8')
+
+    def deduplicate(self, mode):
+        with mock.patch("builtins.print"):
+            return deduplicate_corpus(str(self.input), str(self.output), mode)
+
+    def output_texts(self):
+        return {path.name: path.read_text(encoding='utf-8') for path in sorted(self.output.glob("*.txt"))}
+
+    def test_drop(self):
+        report = self.deduplicate("drop")
+        self.assertEqual(report["excluded"], ["a_old.txt"])
+        self.assertEqual(report["changed"], ["a.txt", "b.txt", "c.txt"])
+        self.assertEqual(report["boilerplate_groups"], 1)
+
+        texts = self.output_texts()
+        self.assertEqual(sorted(texts), ["a.txt", "b.txt", "c.txt"])
+        self.assertTrue(all(DISCLAIMER not in text for text in texts.values()))
+        self.assertFalse((self.output / WEIGHTS_FILE).exists())
+        self.assertGreater(report["chars_saved"], len(self.texts["a_old.txt"]))
+
+    def test_collapse(self):
+        report = self.deduplicate("collapse")
+        self.assertEqual(report["excluded"], ["a_old.txt"])
+        self.assertEqual(report["changed"], ["a.txt", "b.txt", "c.txt"])
+
+        # The first copy of the disclaimer is kept
+        texts = self.output_texts()
+        self.assertEqual(texts["a.txt"], self.texts["a.txt"])
+        self.assertNotIn(DISCLAIMER, texts["b.txt"])
+        self.assertNotIn(DISCLAIMER, texts["c.txt"])
+
+        with open(self.output / REPORT_FILE, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["files"]["a_old.txt"]["duplicate_of"], "a.txt")
+
+    def test_weight(self):
+        report = self.deduplicate("weight")
+        self.assertEqual(report["excluded"], [])
+        self.assertEqual(report["chars_saved"], 0)
+        self.assertGreater(report["redundant_chars"], 0)
+        self.assertEqual(self.output_texts(), self.texts)
+
+        with open(self.output / WEIGHTS_FILE, 'r', encoding='utf-8') as f:
+            weights = json.load(f)
+        self.assertEqual(weights, {"a.txt": 0.5, "a_old.txt": 0.5, "b.txt": 1.0, "c.txt": 1.0})
+
+    def test_changed_only_lists_rewritten_files(self):
+        self.deduplicate("collapse")
+        self.assertEqual(self.deduplicate("collapse")["changed"], [])
+
+        # drop also removes the copy of the disclaimer that collapse kept in a.txt
+        self.assertEqual(self.deduplicate("drop")["changed"], ["a.txt"])
+
+        # weight restores the original texts and the weights file, which drop removes again
+        self.assertEqual(self.deduplicate("weight")["changed"], ["a.txt", "a_old.txt", "b.txt", "c.txt"])
+        self.deduplicate("drop")
+        self.assertFalse((self.output / WEIGHTS_FILE).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
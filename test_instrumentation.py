@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import instrumentation
+
+
+class TrackTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.metrics = Path(tmp.name) / "metrics.jsonl"
+        env = {instrumentation.METRICS_ENV: str(self.metrics), instrumentation.PROFILE_ENV: "translate",
+               instrumentation.PROFILE_DIR_ENV: str(Path(tmp.name) / "profiles")}
+        patcher = mock.patch.dict("os.environ", env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def events(self):
+        with open(self.metrics, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_overlapping_profiled_units(self):
+        # The unit that started tracing finishes while the second one is still being traced
+        first_started = threading.Event()
+        second_started = threading.Event()
+        first_done = threading.Event()
+        errors = []
+
+        def first():
+            with instrumentation.track("translate", "first"):
+                first_started.set()
+                second_started.wait(10)
+            first_done.set()
+
+        def second():
+            first_started.wait(10)
+            try:
+                with instrumentation.track("translate", "second"):
+                    second_started.set()
+                    data = [bytes(1000) for _ in range(100)]
+                    first_done.wait(10)
+                    del data
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        units = {event["item"]: event for event in self.events() if event["event"] == "unit"}
+        self.assertEqual({item: unit["status"] for item, unit in units.items()}, {"first": "ok", "second": "ok"})
+        self.assertNotIn("profile_error", units["second"])
+        self.assertGreaterEqual(units["second"]["traced_peak_bytes"], 100 * 1000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_profiling_errors_do_not_fail_the_unit(self):
+        with mock.patch("instrumentation._memory_profile", side_effect=RuntimeError("not tracing")):
+            with instrumentation.track("translate", "doc") as record:
+                record["items"] = 1
+
+        unit = self.events()[-1]
+        self.assertEqual(unit["status"], "ok")
+        self.assertEqual(unit["profile_error"], "not tracing")
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "needs /proc (Linux)")
+    def test_memory_growth_of_a_unit(self):
+        with instrumentation.track("clean", "large") as record:
+            data = b"x" * 50_000_000
+            record["items"] = len(data)
+        with instrumentation.track("clean", "small"):
+            pass
+        del data
+
+        units = {event["item"]: event for event in self.events()}
+        self.assertGreater(units["large"]["rss_delta_bytes"], 40_000_000)
+        self.assertLess(units["small"]["rss_delta_bytes"], 10_000_000)
+        # The process peak does not tell the two apart
+        self.assertGreaterEqual(units["small"]["process_peak_rss_bytes"], units["large"]["process_peak_rss_bytes"])
+
+        with mock.patch("builtins.print"):
+            stages = instrumentation.summarize(self.metrics)
+        self.assertGreater(stages["clean"]["max_rss_delta_bytes"], 40_000_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
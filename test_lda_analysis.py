@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from lda_analysis import dominant_topics, is_sparse, topic_correlation, topic_importance
+
+# The document-topic helpers on a sparse top-k CSR matrix against the same
+# matrix stored densely (the zeros being the topics that were not kept).
+
+
+class TopicMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dense = np.array([
+            [0.70, 0.20, 0.00, 0.00],
+            [0.00, 0.55, 0.40, 0.00],
+            [0.00, 0.00, 0.00, 0.00],   # no topic above the minimum probability
+            [0.10, 0.00, 0.00, 0.85],
+            [0.00, 0.30, 0.60, 0.05],
+        ], dtype=np.float32)
+        self.sparse = csr_matrix(self.dense)
+
+    def test_is_sparse(self):
+        self.assertTrue(is_sparse(self.sparse))
+        self.assertFalse(is_sparse(self.dense))
+        self.assertFalse(is_sparse(self.dense.tolist()))
+
+    def test_dominant_topics(self):
+        self.assertEqual(dominant_topics(self.sparse), [0, 1, -1, 3, 2])
+        dense = dominant_topics(self.dense)
+        self.assertEqual([topic for i, topic in enumerate(dense) if i != 2], [0, 1, 3, 2])
+
+    def test_topic_importance(self):
+        np.testing.assert_allclose(topic_importance(self.sparse), self.dense.mean(axis=0), rtol=1e-6)
+        np.testing.assert_allclose(topic_importance(self.dense.tolist()), self.dense.mean(axis=0), rtol=1e-6)
+
+    def test_topic_correlation(self):
+        expected = np.corrcoef(self.dense.T.astype(np.float64))
+        np.testing.assert_allclose(topic_correlation(self.sparse), expected, atol=1e-6)
+        np.testing.assert_allclose(topic_correlation(self.dense), expected, atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
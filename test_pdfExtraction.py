@@ -0,0 +1,71 @@
+import io
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from pdfExtraction import MEMBER_SEPARATOR, archive_pdf_names, is_archive, pdf_sources
+
+# Listing the PDFs of archives. The members are not opened, so they are not real PDFs.
+MEMBERS = ["2022/report.pdf", "2023/report.pdf", "summary.PDF", "notes.txt", "__MACOSX/._summary.PDF"]
+
+
+class ArchiveSourcesTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = Path(tmp.name)
+
+    def make_zip(self):
+        path = self.folder / "reports.zip"
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr("2022/", b"")
+            for name in MEMBERS:
+                archive.writestr(name, b"%PDF-1.4")
+        return path
+
+    def make_tar(self, name, mode):
+        path = self.folder / name
+        with tarfile.open(path, mode) as archive:
+            for member in MEMBERS:
+                info = tarfile.TarInfo(member)
+                info.size = 8
+                archive.addfile(info, io.BytesIO(b"%PDF-1.4"))
+        return path
+
+    def test_zip_keeps_first_of_duplicate_names(self):
+        path = self.make_zip()
+        self.assertTrue(is_archive(path))
+        self.assertEqual(archive_pdf_names(path), ["2022/report.pdf", "2023/report.pdf", "summary.PDF"])
+
+        with mock.patch("builtins.print") as printed:
+            sources = pdf_sources(path)
+        self.assertEqual(sources, {"report": f"{path.resolve()}{MEMBER_SEPARATOR}2022/report.pdf",
+                                   "summary": f"{path.resolve()}{MEMBER_SEPARATOR}summary.PDF"})
+        self.assertIn("2023/report.pdf", printed.call_args.args[0])
+
+    def test_plain_tar(self):
+        path = self.make_tar("reports.tar", "w")
+        self.assertEqual(archive_pdf_names(path), ["2022/report.pdf", "2023/report.pdf", "summary.PDF"])
+        with mock.patch("builtins.print"):
+            self.assertEqual(sorted(pdf_sources(path)), ["report", "summary"])
+
+    def test_compressed_tar_is_refused(self):
+        path = self.make_tar("reports.tar.gz", "w:gz")
+        self.assertTrue(is_archive(path))
+        self.assertIsNone(archive_pdf_names(path))
+        with self.assertRaises(ValueError):
+            pdf_sources(path)
+
+    def test_folder(self):
+        for name in ("b.pdf", "a.pdf", "notes.txt"):
+            (self.folder / name).write_bytes(b"")
+        self.assertFalse(is_archive(self.folder))
+        self.assertEqual(pdf_sources(self.folder), {"a": self.folder / "a.pdf", "b": self.folder / "b.pdf"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pipeline
+
+# The stage graph of pipeline.py run with stub units: every document stage
+# writes "<doc>.txt" into its output folder, the model stage records the
+# documents it was trained on. All pools are thread pools so the stubs
+# (and the test's records) stay in this process.
+
+
+class Crash(BaseException):
+    # Not an Exception: escapes run_pipeline like a killed process, without a "failed" line
+    pass
+
+
+def _stub_document(doc, source, output):
+    output.mkdir(parents=True, exist_ok=True)
+    (output / f"{doc}.txt").write_text(doc, encoding='utf-8')
+    return {}
+
+
+def _stub_dedup(docs, source, output, mode="collapse"):
+    # Excludes the documents named "dup*" in drop mode, like a duplicate of another report;
+    # weight mode changes the text of the others, which is only rewritten when it differs
+    output.mkdir(parents=True, exist_ok=True)
+    excluded = [doc for doc in docs if mode == "drop" and doc.startswith("dup")]
+    for doc in docs:
+        path = output / f"{doc}.txt"
+        text = f"{doc} weighted" if mode == "weight" else doc
+        if doc in excluded:
+            path.unlink(missing_ok=True)
+        elif not path.exists() or path.read_text(encoding='utf-8') != text:
+            path.write_text(text, encoding='utf-8')
+    hashes = {doc: pipeline._file_hash(output / f"{doc}.txt") for doc in docs if doc not in excluded}
+    return {"excluded": excluded, "hashes": hashes}
+
+
+def _stub_corpus(docs, source, output, **options):
+    return {"documents": len(docs)}
+
+
+class StubStagesTestCase(unittest.TestCase):
+    # Temporary input / work folders and the stub units (also used by test_work_queue)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.input = Path(tmp.name) / "pdfs"
+        self.input.mkdir()
+        self.workdir = Path(tmp.name) / "run"
+        self.trained = []       # documents of every model run
+        self.model_error = None
+
+        def stub_model(docs, source, output, top_k=None):
+            if self.model_error is not None:
+                raise self.model_error
+            self.trained.append(sorted(p.stem for p in source.glob("*.txt")))
+            return {"documents": len(docs), "top_k": top_k}
+
+        units = {name: _stub_document for name, spec in pipeline.STAGES.items() if spec["scope"] == "document"}
+        units.update(index=_stub_corpus, visualize=_stub_corpus, dedup=_stub_dedup, model=stub_model)
+        stages = {name: {**spec, "executor": "thread"} for name, spec in pipeline.STAGES.items()}
+        for patcher in (mock.patch.dict(pipeline.UNITS, units), mock.patch.dict(pipeline.STAGES, stages)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_pdfs(self, *names):
+        for name in names:
+            (self.input / f"{name}.pdf").write_bytes(b"")
+
+    def run_pipeline(self, **kwargs):
+        with mock.patch("builtins.print"):
+            return pipeline.run_pipeline(self.input, self.workdir, **kwargs)
+
+
+class StubPipelineTest(StubStagesTestCase):
+
+    def test_resume_skips_completed_units(self):
+        self.add_pdfs("a", "b")
+        self.run_pipeline()
+        summary = self.run_pipeline()
+
+        self.assertEqual(self.trained, [["a", "b"]])
+        self.assertTrue(all(counts["done"] == 0 for counts in summary.values()))
+        self.assertEqual(summary["translate"]["skipped"], 2)
+        self.assertEqual(summary["model"]["skipped"], 1)
+
+    def test_failed_model_is_retrained_with_new_document(self):
+        self.add_pdfs("a", "b")
+        self.run_pipeline()
+
+        self.add_pdfs("c")
+        self.model_error = RuntimeError("out of memory")
+        summary = self.run_pipeline()
+        self.assertEqual(summary["filter"]["done"], 1)
+        self.assertEqual(summary["model"]["failed"], 1)
+
+        self.model_error = None
+        summary = self.run_pipeline()
+        self.assertEqual(summary["model"], {"done": 1, "skipped": 0, "failed": 0, "excluded": 0})
+        self.assertEqual(self.trained, [["a", "b"], ["a", "b", "c"]])
+
+    def test_crashed_model_is_retrained_with_new_document(self):
+        self.add_pdfs("a", "b")
+        self.run_pipeline()
+
+        self.add_pdfs("c")
+        self.model_error = Crash()
+        with self.assertRaises(Crash):
+            self.run_pipeline()
+
+        self.model_error = None
+        summary = self.run_pipeline()
+        self.assertEqual(summary["filter"]["skipped"], 3)
+        self.assertEqual(summary["model"]["done"], 1)
+        self.assertEqual(self.trained, [["a", "b"], ["a", "b", "c"]])
+
+    def test_excluded_document_outputs_are_removed(self):
+        self.add_pdfs("a", "dup")
+        self.run_pipeline()
+
+        summary = self.run_pipeline(restart=True, options={"dedup": {"mode": "drop"}})
+        self.assertEqual(summary["translate"]["excluded"], 1)
+        self.assertEqual(self.trained, [["a", "dup"], ["a"]])
+        for name in ("translate", "preprocess", "filter"):
+            output = self.workdir / pipeline.STAGES[name]["output"]
+            self.assertEqual(sorted(p.name for p in output.iterdir()), ["a.txt"])
+
+    def test_removed_document_leaves_the_corpus_stages(self):
+        self.add_pdfs("a", "b")
+        self.run_pipeline()
+
+        (self.input / "b.pdf").unlink()
+        summary = self.run_pipeline()
+        self.assertEqual(summary["model"]["done"], 1)
+        self.assertEqual(self.trained, [["a", "b"], ["a"]])
+        for name in ("extract", "dedup", "translate", "preprocess", "filter"):
+            output = self.workdir / pipeline.STAGES[name]["output"]
+            self.assertEqual(sorted(p.name for p in output.glob("*.txt")), ["a.txt"])
+
+    def test_changed_options_rerun_their_stage(self):
+        self.add_pdfs("a", "dup")
+        self.run_pipeline(options={"dedup": {"mode": "collapse"}})
+
+        summary = self.run_pipeline(options={"dedup": {"mode": "drop"}, "model": {"top_k": 3}})
+        self.assertEqual(summary["dedup"]["done"], 1)
+        self.assertEqual(summary["translate"], {"done": 0, "skipped": 1, "failed": 0, "excluded": 1})
+        self.assertEqual(summary["model"]["done"], 1)
+        self.assertEqual(summary["visualize"]["done"], 1)
+        self.assertEqual(self.trained, [["a", "dup"], ["a"]])
+
+        summary = self.run_pipeline(options={"dedup": {"mode": "drop"}, "model": {"top_k": 5}})
+        self.assertEqual(summary["dedup"]["skipped"], 1)
+        self.assertEqual(summary["model"]["done"], 1)
+        self.assertEqual(pipeline.load_state(self.workdir)[("model", None)]["result"]["top_k"], 5)
+
+    def test_dedup_killed_after_rewriting_reruns_translation(self):
+        self.add_pdfs("a", "b")
+        self.run_pipeline(options={"dedup": {"mode": "collapse"}})
+
+        def killed_dedup(docs, source, output, mode="collapse"):
+            _stub_dedup(docs, source, output, mode)
+            raise Crash()
+
+        with mock.patch.dict(pipeline.UNITS, {"dedup": killed_dedup}), self.assertRaises(Crash):
+            self.run_pipeline(options={"dedup": {"mode": "weight"}})
+
+        # The rewritten files already match on disk, but not the journaled hashes
+        summary = self.run_pipeline(options={"dedup": {"mode": "weight"}})
+        self.assertEqual(summary["dedup"]["done"], 1)
+        self.assertEqual(summary["translate"]["done"], 2)
+
+        summary = self.run_pipeline(options={"dedup": {"mode": "weight"}})
+        self.assertEqual(summary["translate"]["skipped"], 2)
+
+    def test_last_journal_line_wins(self):
+        self.add_pdfs("a")
+        self.run_pipeline()
+        with pipeline.open_journal(self.workdir) as state_file:
+            pipeline._journal(state_file, "filter", "a", "failed", {"error": "disk full"})
+
+        self.assertNotIn(("filter", "a"), pipeline.load_state(self.workdir))
+        summary = self.run_pipeline()
+        self.assertEqual(summary["filter"]["done"], 1)
+        self.assertEqual(summary["model"]["done"], 1)
+
+    def test_partial_journal_line_is_ignored(self):
+        self.add_pdfs("a")
+        self.run_pipeline()
+        with open(self.workdir / pipeline.STATE_FILE, 'a', encoding='utf-8') as f:
+            f.write('{"stage": "model", "doc": nu')
+
+        summary = self.run_pipeline()
+        self.assertEqual(summary["model"]["skipped"], 1)
+        self.assertIn(("model", None), pipeline.load_state(self.workdir))
+
+    def test_parse_workers(self):
+        self.assertEqual(pipeline._parse_workers(["translate=8", "preprocess=2"]), {"translate": 8, "preprocess": 2})
+        self.assertEqual(pipeline._parse_workers(None), {})
+        for value in ("translate", "translate=x", "unknown=2"):
+            with self.assertRaises(ValueError):
+                pipeline._parse_workers([value])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import signal
+import sqlite3
+import unittest
+from collections import Counter
+from unittest import mock
+
+import pipeline
+import work_queue
+from test_pipeline import StubStagesTestCase, _stub_document
+
+# Several local worker processes against a queue in a temporary folder.
+# Workers are forked (not spawned) so that they keep the stub units of the test.
+FORK = multiprocessing.get_context("fork")
+STAGES = ["extract", "clean"]
+
+
+def _quiet_worker(queue_path, lease_seconds):
+    with contextlib.redirect_stdout(io.StringIO()):
+        work_queue.run_worker(queue_path, STAGES, batch_size=2, lease_seconds=lease_seconds, poll_interval=0.1)
+
+
+def _claim_and_die(queue_path, lease_seconds):
+    # A worker killed while it holds a lease: its units stay 'leased' until the lease expires
+    conn = work_queue.connect(queue_path)
+    work_queue.claim_batch(conn, "killed-worker", 2, lease_seconds, 3, STAGES)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class WorkQueueTest(StubStagesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.queue = str(self.workdir.parent / "queue.db")
+        self.log = self.workdir.parent / "units.log"
+
+        def logged_unit(stage):
+            def unit(doc, source, output):
+                # One line per execution, appended by whichever worker process runs the unit
+                with open(self.log, 'a', encoding='utf-8') as f:
+                    f.write(f"{stage} {doc}\n")
+                return _stub_document(doc, source, output)
+            return unit
+
+        patcher = mock.patch.dict(pipeline.UNITS, {name: logged_unit(name) for name in STAGES})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_process(self, target, *args):
+        process = FORK.Process(target=target, args=(self.queue, *args))
+        process.start()
+        return process
+
+    def executions(self):
+        with open(self.log, 'r', encoding='utf-8') as f:
+            return Counter(line.strip() for line in f)
+
+    def units(self):
+        with sqlite3.connect(self.queue) as conn:
+            return {(stage, doc): (state, attempts)
+                    for stage, doc, state, attempts in conn.execute("SELECT stage, doc, state, attempts FROM units")}
+
+    def test_workers_drain_queue_and_pipeline_resumes(self):
+        docs = [f"doc{i}" for i in range(8)]
+        self.add_pdfs(*docs)
+        with mock.patch("builtins.print"):
+            self.assertEqual(work_queue.enqueue(self.queue, self.input, self.workdir, STAGES), 16)
+
+        killed = self.run_process(_claim_and_die, 0.5)
+        killed.join(10)
+        self.assertEqual(killed.exitcode, -signal.SIGKILL)
+
+        workers = [self.run_process(_quiet_worker, 30) for _ in range(3)]
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+
+        # Every unit is done and ran exactly once, the killed worker's two units on a second lease
+        units = self.units()
+        self.assertEqual({state for state, _ in units.values()}, {"done"})
+        self.assertEqual(sorted(key for key, (_, attempts) in units.items() if attempts == 2),
+                         [("extract", "doc0"), ("extract", "doc1")])
+        executions = self.executions()
+        self.assertEqual(len(executions), 16)
+        self.assertEqual(set(executions.values()), {1})
+
+        with mock.patch("builtins.print"):
+            work_queue.report(self.queue, write_journal=True)
+        summary = self.run_pipeline()
+        for name in STAGES:
+            self.assertEqual(summary[name], {"done": 0, "skipped": 8, "failed": 0, "excluded": 0})
+        self.assertEqual(summary["model"]["done"], 1)
+        self.assertEqual(self.trained, [docs])
+        self.assertEqual(sum(self.executions().values()), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
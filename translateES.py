@@ -1,10 +1,7 @@
-from googletrans import Translator
-from langdetect import detect, DetectorFactory
 import os
+import time
 
-# For consistent language detection
-DetectorFactory.seed = 0
-
+from instrumentation import emit, track, tracked
 
 def detect_language(text: str) -> str:
     """
@@ -12,6 +9,11 @@ def detect_language(text: str) -> str:
     Returns a language code (e.g., 'en', 'es').
     Uses only the first 1000 characters for reliability.
     """
+    from langdetect import detect, DetectorFactory
+
+    # For consistent language detection
+    DetectorFactory.seed = 0
+
     try:
         sample_text = text[:1000]
         lang = detect(sample_text)
@@ -20,12 +22,16 @@ def detect_language(text: str) -> str:
         return "unknown"
 
 
-def translate_text_to_spanish(text: str, max_chunk_size: int = 4500) -> str:
+def translate_text_to_spanish(text: str, max_chunk_size: int = 4500, translator=None) -> str:
     """
     Translate English text into Spanish, splitting it into chunks
     to avoid API size limits.
+    Any object with a googletrans-like translate(text, src, dest) method
+    can be passed as translator (e.g. a local stub for benchmarks).
     """
-    translator = Translator()
+    if translator is None:
+        from googletrans import Translator
+        translator = Translator()
     chunks = []
     start = 0
 
@@ -44,25 +50,74 @@ def translate_text_to_spanish(text: str, max_chunk_size: int = 4500) -> str:
 
     translated_chunks = []
     for i, chunk in enumerate(chunks):
+        start_time = time.perf_counter()
         try:
-            print(f"  Translating chunk {i + 1}/{len(chunks)}... ({len(chunk)} chars)")
             translation = translator.translate(chunk, src='en', dest='es')
             translated_chunks.append(translation.text)
+            status = "ok"
         except Exception as e:
             print(f"    ERROR at chunk {i + 1}: {e}. Using original text for this part.")
             translated_chunks.append(chunk)
+            status = "error"
+        emit("translate_chunk", chunk=i + 1, chunks=len(chunks), chars=len(chunk),
+             wall_s=round(time.perf_counter() - start_time, 6), status=status)
 
     translated_text = " ".join(translated_chunks)
     return translated_text
 
 
+def translate_file(input_filepath: str, output_filepath: str) -> str:
+    """
+    Detect the language of one .txt file and write it to the output path,
+    translated into Spanish if it is English (copied unchanged otherwise).
+    Returns the detected language code ('' if the file is empty and skipped).
+    """
+    filename = os.path.basename(input_filepath)
+
+    with track("translate", filename) as metrics:
+        with open(input_filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        metrics.update(bytes_in=len(content))
+
+        if not content.strip():
+            print(f"  SKIP: File {filename} is empty.")
+            return ''
+
+        lang = detect_language(content)
+        print(f"  Detected: {lang}")
+
+        if lang == 'en':
+            print(f"  Translating EN -> ES...")
+            translated_content = translate_text_to_spanish(content)
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(translated_content)
+            print(f"  Saved: {output_filepath} (TRANSLATED)")
+            metrics.update(bytes_out=len(translated_content))
+
+        elif lang == 'es':
+            print(f"  OK (Spanish). Copying file.")
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+            metrics.update(bytes_out=len(content))
+
+        else:
+            print(f"  WARNING: Unknown language ('{lang}') or detection failed.")
+            print(f"  Copying original file without changes.")
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+            metrics.update(bytes_out=len(content))
+
+        metrics.update(lang=lang)
+        return lang
+
+
+@tracked("translate")
 def process_directory(input_dir: str, output_dir: str):
     """
     Process all .txt files in a folder, detect the language,
     and translate English files into Spanish.
     """
     os.makedirs(output_dir, exist_ok=True)
-    translator = Translator()
 
     for filename in os.listdir(input_dir):
         if filename.endswith(".txt"):
@@ -70,34 +125,7 @@ def process_directory(input_dir: str, output_dir: str):
             output_filepath = os.path.join(output_dir, filename)
 
             print(f"\nProcessing: {filename}")
-
-            with open(input_filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-
-            if not content.strip():
-                print(f"  SKIP: File {filename} is empty.")
-                continue
-
-            lang = detect_language(content)
-            print(f"  Detected: {lang}")
-
-            if lang == 'en':
-                print(f"  Translating EN -> ES...")
-                translated_content = translate_text_to_spanish(content)
-                with open(output_filepath, 'w', encoding='utf-8') as f:
-                    f.write(translated_content)
-                print(f"  Saved: {output_filepath} (TRANSLATED)")
-
-            elif lang == 'es':
-                print(f"  OK (Spanish). Copying file.")
-                with open(output_filepath, 'w', encoding='utf-8') as f:
-                    f.write(content)
-
-            else:
-                print(f"  WARNING: Unknown language ('{lang}') or detection failed.")
-                print(f"  Copying original file without changes.")
-                with open(output_filepath, 'w', encoding='utf-8') as f:
-                    f.write(content)
+            translate_file(input_filepath, output_filepath)
 
 
 # === CONFIGURATION ===
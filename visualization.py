@@ -1,40 +1,49 @@
 import pickle
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.colors import LinearSegmentedColormap, ListedColormap
 from collections import Counter
 import math
 
+from instrumentation import track, tracked
+from lda_analysis import dense_topic_matrix, is_sparse, topic_correlation, topic_importance
 
-def load_lda_results():
+
+def load_lda_results(results_file='lda_results.pkl'):
     """Load saved LDA results"""
-    with open('lda_results.pkl', 'rb') as f:
+    with open(results_file, 'rb') as f:
         return pickle.load(f)
 
 
-def create_advanced_visualizations():
+@tracked("visualize")
+def create_advanced_visualizations(results_file='lda_results.pkl', show=True):
     """
     Create advanced visualizations for LDA results
     """
+    import numpy as np
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     print("🎨 Creating advanced visualizations...")
-    results = load_lda_results()
+    results = load_lda_results(results_file)
 
     # Unpack results
     lda_model = results['lda_model']
     file_names = results['file_names']
-    topic_matrix = np.array(results['topic_matrix'])
+    # Dense list of lists, or sparse CSR matrix of the top-k topics per document
+    all_topics = results['topic_matrix']
+    if not is_sparse(all_topics):
+        all_topics = np.array(all_topics)
     topic_distribution = results['topic_distribution']
     num_topics = results['num_topics']
 
     # Limit to 15 documents for better visualization
+    # (importance and correlation are computed over all documents)
     max_docs = min(15, len(file_names))
     file_names = file_names[:max_docs]
-    topic_matrix = topic_matrix[:max_docs, :]
+    topic_matrix = dense_topic_matrix(all_topics[:max_docs, :])
 
     # EXTRACT AND SAVE TOPIC WORDS to simple text file
     print("💬 Extracting and saving topic words...")
-    extract_topic_words_simple(lda_model, num_topics)
+    with track("visualize", "topic_words"):
+        extract_topic_words_simple(lda_model, num_topics)
 
     # Set style
     plt.style.use('default')
@@ -42,33 +51,43 @@ def create_advanced_visualizations():
 
     # 1. HEATMAP
     print("🔥 Creating enhanced heatmap...")
-    create_heatmap(topic_matrix, file_names, num_topics)
+    with track("visualize", "heatmap"):
+        create_heatmap(topic_matrix, file_names, num_topics)
 
     # 2. TOPIC IMPORTANCE CHART
     print("📊 Creating topic importance chart...")
-    create_topic_importance_chart(topic_matrix, num_topics)
+    with track("visualize", "importance"):
+        create_topic_importance_chart(all_topics, num_topics)
 
     # 3. DOCUMENT TOPIC DISTRIBUTION
     print("📈 Creating document distribution chart...")
-    create_document_distribution_chart(topic_distribution, num_topics)
+    with track("visualize", "distribution"):
+        create_document_distribution_chart(topic_distribution, num_topics)
 
     # 4. TOPIC WORD BARCHARTS
     print("📝 Creating topic word barcharts...")
-    create_topic_barcharts(lda_model, num_topics)
+    with track("visualize", "barcharts"):
+        create_topic_barcharts(lda_model, num_topics)
 
     # 5. TOPIC CORRELATION HEATMAP
     print("🔗 Creating topic correlation heatmap...")
-    create_topic_correlation_heatmap(topic_matrix, num_topics)
+    with track("visualize", "correlation"):
+        create_topic_correlation_heatmap(all_topics, num_topics)
 
     # 6. TOPIC TRENDS
     print("📈 Creating topic trends chart...")
-    create_topic_trends_chart(topic_matrix, num_topics)
+    with track("visualize", "trends"):
+        create_topic_trends_chart(topic_matrix, num_topics)
 
     # 7. TOPIC WORDS CLOUD
     print("☁️ Creating topic words visualization...")
-    create_topic_words_visualization(lda_model, num_topics)
+    with track("visualize", "words"):
+        create_topic_words_visualization(lda_model, num_topics)
 
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close('all')
 
 
 def extract_topic_words_simple(lda_model, num_topics, topn=15):
@@ -90,6 +109,9 @@ def extract_topic_words_simple(lda_model, num_topics, topn=15):
 
 def create_heatmap(topic_matrix, file_names, num_topics):
     """Create enhanced heatmap"""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LinearSegmentedColormap
+
     fig, ax = plt.subplots(figsize=(14, 10))
 
     # Create a custom colormap with distinct colors
@@ -120,8 +142,10 @@ def create_heatmap(topic_matrix, file_names, num_topics):
 
 def create_topic_importance_chart(topic_matrix, num_topics):
     """Create topic importance bar chart"""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(12, 8))
-    avg_probs = topic_matrix.mean(axis=0)
+    avg_probs = topic_importance(topic_matrix)
 
     # Create a color for each topic
     colors = plt.cm.tab20(range(num_topics))
@@ -153,6 +177,8 @@ def create_topic_importance_chart(topic_matrix, num_topics):
 
 def create_document_distribution_chart(topic_distribution, num_topics):
     """Create document distribution pie chart"""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(12, 8))
     topic_counts = Counter([t[1] for t in topic_distribution if t[1] != -1])
     counts = [topic_counts.get(i, 0) for i in range(num_topics)]
@@ -177,6 +203,9 @@ def create_document_distribution_chart(topic_distribution, num_topics):
 
 def create_topic_barcharts(lda_model, num_topics):
     """Create bar charts for topic words"""
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     cols = min(4, num_topics)  # maximum number of columns
     rows = math.ceil(num_topics / cols)
 
@@ -214,8 +243,10 @@ def create_topic_barcharts(lda_model, num_topics):
 
 def create_topic_correlation_heatmap(topic_matrix, num_topics):
     """Create topic correlation heatmap"""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(10, 8))
-    correlation_matrix = np.corrcoef(topic_matrix.T)
+    correlation_matrix = topic_correlation(topic_matrix)
 
     im = ax.imshow(correlation_matrix, cmap='RdBu_r', vmin=-1, vmax=1, aspect='equal')
 
@@ -243,6 +274,8 @@ def create_topic_correlation_heatmap(topic_matrix, num_topics):
 
 def create_topic_trends_chart(topic_matrix, num_topics):
     """Create topic trends across documents"""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(14, 8))
 
     # Use a colormap with distinct colors
@@ -272,6 +305,9 @@ def create_topic_trends_chart(topic_matrix, num_topics):
 
 def create_topic_words_visualization(lda_model, num_topics):
     """Create a visualization of top words for each topic"""
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     fig, axes = plt.subplots(num_topics, 1, figsize=(10, 3 * num_topics))
 
     if num_topics == 1:
@@ -0,0 +1,405 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from instrumentation import emit
+from pdfExtraction import pdf_sources
+from pipeline import (STAGES, STATE_FILE, UNITS, _journal, load_state, open_journal, select_stages, stage_folders,
+                      unit_inputs)
+
+# Multi-node mode: a SQLite queue on shared storage that several worker
+# processes (on one or many hosts) poll to claim batches of document units.
+# A claimed unit holds a lease that its worker keeps extending with heartbeats;
+# if the worker dies the lease expires and another worker picks the unit up.
+#
+# The database uses the default rollback journal (not WAL), which is the mode
+# SQLite supports on network filesystems with working POSIX locks.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS units (
+    stage TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    source TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL,
+    PRIMARY KEY (stage, doc)
+);
+CREATE INDEX IF NOT EXISTS units_state ON units (state, stage);
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started REAL,
+    heartbeat REAL,
+    units_done INTEGER NOT NULL DEFAULT 0,
+    units_failed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+DOCUMENT_STAGES = [name for name in select_stages() if STAGES[name]["scope"] == "document"]
+
+
+def _ancestors(name):
+    found = set()
+    pending = list(STAGES[name]["deps"])
+    while pending:
+        dep = pending.pop()
+        if dep not in found:
+            found.add(dep)
+            pending.extend(STAGES[dep]["deps"])
+    return found
+
+
+def connect(queue_path):
+    conn = sqlite3.connect(str(queue_path), timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _meta(conn):
+    return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+
+# === QUEUE SETUP ===
+
+def enqueue(queue_path, input_folder, workdir, stages=None):
+    """
+    Create (or extend) the queue with one unit per PDF and document stage.
+    Stages that follow a corpus stage (e.g. translate after dedup) are only queued
+    once that stage is in the journal of workdir, without the documents it excluded.
+    Returns the number of newly added units.
+    """
+    stages = stages or DOCUMENT_STAGES
+    for name in stages:
+        if name not in DOCUMENT_STAGES:
+            raise ValueError(f"Only document stages can be queued, not: {name}")
+
+    journal = load_state(workdir)
+    ready = {}
+    for name in stages:
+        corpus_stages = sorted(dep for dep in _ancestors(name) if STAGES[dep]["scope"] == "corpus")
+        waiting = [dep for dep in corpus_stages if (dep, None) not in journal]
+        if waiting:
+            print(f"Not queuing {name}: run 'pipeline.py --until {waiting[0]}' first")
+            continue
+        ready[name] = {doc for dep in corpus_stages
+                       for doc in (journal[(dep, None)]["result"] or {}).get("excluded", [])}
+
+    input_path = Path(input_folder).resolve()
+    sources = pdf_sources(input_path)
+    if not sources:
+        print("No PDF files found in the input folder.")
+        return 0
+
+    conn = connect(queue_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('input_folder', ?)", (str(input_path),))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('workdir', ?)", (str(Path(workdir).resolve()),))
+        before = conn.total_changes
+        now = time.time()
+        for name, excluded in ready.items():
+            conn.executemany(
+                "INSERT OR IGNORE INTO units (stage, doc, source, updated) VALUES (?, ?, ?, ?)",
+                [(name, doc, str(source), now) for doc, source in sources.items() if doc not in excluded])
+        added = conn.total_changes - before
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    print(f"Queued {added} units ({len(sources)} documents x {len(ready)} stages)")
+    return added
+
+
+# === WORKER ===
+
+def claim_batch(conn, owner, batch_size, lease_seconds, max_attempts, stages=None):
+    """Atomically lease up to batch_size units whose document dependencies are done"""
+    now = time.time()
+    claimed = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Units whose last attempt died with its worker cannot be retried any more
+        conn.execute("UPDATE units SET state = 'failed', owner = NULL, error = 'lease expired', updated = ? "
+                     "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                     (now, now, max_attempts))
+        for name in stages or DOCUMENT_STAGES:
+            if len(claimed) >= batch_size:
+                break
+            deps = STAGES[name]["deps"]
+            # A dependency that is not in the queue counts as done (it was produced elsewhere)
+            dep_filter = ""
+            if deps:
+                placeholders = ",".join("?" * len(deps))
+                dep_filter = (f"AND NOT EXISTS (SELECT 1 FROM units d WHERE d.doc = u.doc "
+                              f"AND d.stage IN ({placeholders}) AND d.state != 'done')")
+            rows = conn.execute(
+                f"SELECT stage, doc, source FROM units u WHERE u.stage = ? "
+                f"AND (u.state = 'pending' OR (u.state = 'leased' AND u.lease_expires < ?)) "
+                f"AND u.attempts < ? {dep_filter} ORDER BY u.doc LIMIT ?",
+                [name, now, max_attempts, *deps, batch_size - len(claimed)]).fetchall()
+            for stage, doc, source in rows:
+                conn.execute(
+                    "UPDATE units SET state = 'leased', owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE stage = ? AND doc = ?",
+                    (owner, now + lease_seconds, now, stage, doc))
+                claimed.append((stage, doc, source))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return claimed
+
+
+def finish_unit(conn, owner, stage, doc, result=None, error=None, max_attempts=3):
+    """Record the outcome of a unit, only if this worker still holds its lease"""
+    now = time.time()
+    if error is None:
+        cursor = conn.execute(
+            "UPDATE units SET state = 'done', owner = NULL, lease_expires = NULL, result = ?, "
+            "error = NULL, updated = ? WHERE stage = ? AND doc = ? AND owner = ? AND state = 'leased'",
+            (json.dumps(result), now, stage, doc, owner))
+        column = "units_done"
+    else:
+        # Give the unit back to the queue until it has used all its attempts
+        cursor = conn.execute(
+            "UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+            "WHERE stage = ? AND doc = ? AND owner = ? AND state = 'leased'",
+            (max_attempts, error, now, stage, doc, owner))
+        column = "units_failed"
+    if cursor.rowcount != 1:
+        return False
+    conn.execute(f"UPDATE workers SET {column} = {column} + 1 WHERE owner = ?", (owner,))
+    return True
+
+
+def open_units(conn, stages=None):
+    """Count units that are leased or can still become claimable (no failed dependency)"""
+    total = 0
+    for name in stages or DOCUMENT_STAGES:
+        ancestors = sorted(_ancestors(name))
+        blocked = ""
+        if ancestors:
+            placeholders = ",".join("?" * len(ancestors))
+            blocked = (f"AND NOT EXISTS (SELECT 1 FROM units d WHERE d.doc = u.doc "
+                       f"AND d.stage IN ({placeholders}) AND d.state = 'failed')")
+        total += conn.execute(
+            f"SELECT COUNT(*) FROM units u WHERE u.stage = ? AND u.state IN ('pending', 'leased') {blocked}",
+            [name, *ancestors]).fetchone()[0]
+    return total
+
+
+def _heartbeat(queue_path, owner, lease_seconds, stop):
+    # Separate connection: sqlite3 connections must not be shared across threads
+    conn = connect(queue_path)
+    try:
+        while not stop.wait(lease_seconds / 3):
+            now = time.time()
+            conn.execute("UPDATE units SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+                         (now + lease_seconds, owner))
+            conn.execute("UPDATE workers SET heartbeat = ? WHERE owner = ?", (now, owner))
+    finally:
+        conn.close()
+
+
+def run_worker(queue_path, stages=None, batch_size=4, lease_seconds=300, max_attempts=3, poll_interval=5.0):
+    """
+    Claim and process batches until no unit is left to do.
+    Returns the number of units this worker completed.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    conn = connect(queue_path)
+    meta = _meta(conn)
+    if "workdir" not in meta:
+        raise RuntimeError(f"Queue {queue_path} is empty, run 'enqueue' first")
+    input_folder, workdir = meta["input_folder"], meta["workdir"]
+
+    now = time.time()
+    conn.execute("INSERT OR REPLACE INTO workers (owner, host, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                 (owner, socket.gethostname(), os.getpid(), now, now))
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue_path, owner, lease_seconds, stop), daemon=True)
+    heartbeat.start()
+
+    completed = 0
+    print(f"Worker {owner} started")
+    try:
+        while True:
+            batch = claim_batch(conn, owner, batch_size, lease_seconds, max_attempts, stages)
+            if not batch:
+                if open_units(conn, stages) == 0:
+                    break
+                # Remaining units wait for dependencies or are leased by other workers
+                time.sleep(poll_interval)
+                continue
+
+            for stage, doc, source in batch:
+                stage_source, output = stage_folders(stage, input_folder, workdir)
+                if stage == "extract":
+                    stage_source = source
+                start_time = time.time()
+                try:
+                    result = UNITS[stage](doc, stage_source, output)
+                except Exception as e:
+                    print(f"[{stage}] Failed: {doc} ({e})")
+                    emit("queue_unit", stage=stage, item=doc, owner=owner, status="error", error=str(e))
+                    finish_unit(conn, owner, stage, doc, error=str(e), max_attempts=max_attempts)
+                    continue
+
+                seconds = time.time() - start_time
+                if finish_unit(conn, owner, stage, doc, result=result):
+                    completed += 1
+                    print(f"[{stage}] Done: {doc} ({seconds:.1f}s)")
+                else:
+                    print(f"[{stage}] Lease lost: {doc} (result discarded)")
+                emit("queue_unit", stage=stage, item=doc, owner=owner, status="ok", wall_s=round(seconds, 6))
+    finally:
+        stop.set()
+        heartbeat.join()
+        conn.close()
+
+    print(f"Worker {owner} finished: {completed} units")
+    return completed
+
+
+# === REPORT ===
+
+def report(queue_path, output_file=None, write_journal=False):
+    """
+    Merge the state of all workers into one completion report.
+    With write_journal, done units are appended to the pipeline journal of the
+    work directory, so 'pipeline.py' resumes from them and runs the corpus stages.
+    """
+    conn = connect(queue_path)
+    try:
+        meta = _meta(conn)
+        now = time.time()
+        stages = {}
+        for stage, state, count in conn.execute("SELECT stage, state, COUNT(*) FROM units GROUP BY stage, state"):
+            stages.setdefault(stage, {})[state] = count
+        expired = conn.execute("SELECT COUNT(*) FROM units WHERE state = 'leased' AND lease_expires < ?",
+                               (now,)).fetchone()[0]
+        workers = [
+            {"owner": owner, "host": host, "pid": pid, "units_done": done, "units_failed": failed,
+             "seconds_since_heartbeat": round(now - heartbeat, 1)}
+            for owner, host, pid, heartbeat, done, failed in conn.execute(
+                "SELECT owner, host, pid, heartbeat, units_done, units_failed FROM workers ORDER BY owner")]
+        failures = [
+            {"stage": stage, "doc": doc, "attempts": attempts, "error": error}
+            for stage, doc, attempts, error in conn.execute(
+                "SELECT stage, doc, attempts, error FROM units WHERE state = 'failed' ORDER BY stage, doc")]
+        done_units = conn.execute("SELECT stage, doc, result FROM units WHERE state = 'done'").fetchall()
+    finally:
+        conn.close()
+
+    summary = {"queue": str(queue_path), "workdir": meta.get("workdir"), "stages": stages,
+               "expired_leases": expired, "workers": workers, "failures": failures}
+
+    print("=" * 60)
+    print("QUEUE REPORT")
+    print("=" * 60)
+    for stage in DOCUMENT_STAGES:
+        if stage in stages:
+            counts = stages[stage]
+            print(f"{stage:<12} " + "  ".join(f"{state}: {counts.get(state, 0)}"
+                                              for state in ("done", "pending", "leased", "failed")))
+    print(f"Expired leases: {expired}")
+    for worker in workers:
+        print(f"  {worker['owner']:<30} done: {worker['units_done']:<6} failed: {worker['units_failed']}")
+
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Report saved to '{output_file}'")
+
+    if write_journal and meta.get("workdir"):
+        workdir = Path(meta["workdir"])
+        workdir.mkdir(parents=True, exist_ok=True)
+        journaled = load_state(workdir)
+        added = 0
+        with open_journal(workdir) as state_file:
+            # In stage order, so that every unit is journaled with the versions of its inputs
+            for stage, doc, result in sorted(done_units, key=lambda unit: DOCUMENT_STAGES.index(unit[0])):
+                try:
+                    inputs = unit_inputs(stage, doc, journaled, [doc])
+                except KeyError:
+                    # An input is not in the journal: the pipeline runs this unit again
+                    continue
+                if (stage, doc) in journaled and journaled[(stage, doc)].get("inputs") == inputs:
+                    continue
+                result = json.loads(result) if result else None
+                position = _journal(state_file, stage, doc, "done", result, inputs=inputs)
+                journaled[(stage, doc)] = {"result": result, "position": position, "inputs": inputs}
+                added += 1
+        print(f"Added {added} units to {workdir / STATE_FILE}")
+
+    return summary
+
+
+def spawn_workers(queue_path, count, worker_args=()):
+    """Launch 'count' local worker processes against the queue and wait for them"""
+    script = Path(__file__).resolve()
+    processes = [subprocess.Popen([sys.executable, str(script), "worker", str(queue_path), *worker_args])
+                 for _ in range(count)]
+    return [process.wait() for process in processes]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared-filesystem work queue for the pipeline document stages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Add one unit per PDF and stage to the queue")
+    enqueue_parser.add_argument("queue", help="SQLite queue file on shared storage")
+    enqueue_parser.add_argument("input_folder", help="Folder (or zip / tar archive) with the source PDF files")
+    enqueue_parser.add_argument("--workdir", default="pipeline_run", help="Shared folder for all stage outputs")
+    enqueue_parser.add_argument("--stages", nargs="*", choices=DOCUMENT_STAGES, help="Stages to queue (default: all)")
+
+    for name, help_text in (("worker", "Claim and process units until the queue is drained"),
+                            ("spawn", "Start several local workers (single-machine testing)")):
+        worker_parser = commands.add_parser(name, help=help_text)
+        worker_parser.add_argument("queue")
+        if name == "spawn":
+            worker_parser.add_argument("--processes", type=int, default=4, help="Number of worker processes")
+        worker_parser.add_argument("--stages", nargs="*", choices=DOCUMENT_STAGES, help="Only claim these stages")
+        worker_parser.add_argument("--batch-size", type=int, default=4)
+        worker_parser.add_argument("--lease", type=float, default=300, help="Lease duration in seconds")
+        worker_parser.add_argument("--max-attempts", type=int, default=3)
+        worker_parser.add_argument("--poll", type=float, default=5.0, help="Seconds between polls when idle")
+
+    report_parser = commands.add_parser("report", help="Print the merged completion report")
+    report_parser.add_argument("queue")
+    report_parser.add_argument("--output", help="Also save the report as JSON")
+    report_parser.add_argument("--journal", action="store_true",
+                               help="Append done units to the pipeline journal so pipeline.py can resume")
+
+    args = parser.parse_args()
+    if args.command == "enqueue":
+        enqueue(args.queue, args.input_folder, args.workdir, args.stages)
+    elif args.command == "worker":
+        run_worker(args.queue, args.stages, args.batch_size, args.lease, args.max_attempts, args.poll)
+    elif args.command == "spawn":
+        worker_args = ["--batch-size", str(args.batch_size), "--lease", str(args.lease),
+                       "--max-attempts", str(args.max_attempts), "--poll", str(args.poll)]
+        if args.stages:
+            worker_args += ["--stages", *args.stages]
+        spawn_workers(args.queue, args.processes, worker_args)
+        report(args.queue)
+    else:
+        report(args.queue, args.output, args.journal)